@@ -0,0 +1,465 @@
+"""
+Code analysis engine for the Coding AI Assistant
+Parses Python once and runs every registered rule in a single AST walk, checks
+JavaScript/TypeScript from one token stream, and memoizes results by content hash
+"""
+
+import ast
+import json
+import hashlib
+import time
+import functools
+from typing import Dict, Any, List, Callable, Optional, Tuple, Type
+
+from cache import LRUCache
+from js_lexer import tokenize, Token, KEYWORDS as JS_KEYWORDS
+
+# Standard modules that generated code commonly uses without importing
+COMMON_MODULES = frozenset({'os', 'sys', 'json', 'datetime', 'typing', 'math', 'random', 're'})
+
+# Results keyed by (analyzer, version, sha256 of the code), bounded by approximate result size
+DEFAULT_ANALYSIS_CACHE_MB = 32
+analysis_cache = LRUCache(
+    max_entries=100000,
+    max_bytes=DEFAULT_ANALYSIS_CACHE_MB * 1024 * 1024,
+    sizeof=lambda result: len(json.dumps(result, default=str)) + 64
+)
+
+
+def configure_cache(max_mb: int) -> None:
+    """Set the analysis cache budget; call at startup, once the environment is loaded"""
+    analysis_cache.clear()
+    analysis_cache.max_bytes = max_mb * 1024 * 1024
+
+
+def cached_analysis(name: str, version: int) -> Callable:
+    """Memoize an analyzer taking a code string by content hash
+
+    Bump `version` whenever the analyzer's output changes so stale results
+    are not served. Cached results are shared and must be treated as read-only.
+    """
+    def decorator(analyze: Callable[[str], Any]) -> Callable[[str], Any]:
+        def cache_key(code: str) -> tuple:
+            return (name, version, hashlib.sha256(code.encode("utf-8", "surrogatepass")).hexdigest())
+
+        @functools.wraps(analyze)
+        def wrapper(code: str) -> Any:
+            key = cache_key(code)
+            result = analysis_cache.get(key)
+            if result is None:
+                result = analyze(code)
+                analysis_cache.set(key, result)
+            return result
+        wrapper.uncached = analyze
+        wrapper.cache_key = cache_key
+        return wrapper
+    return decorator
+
+
+# rule name -> {"calls": visits and finish() calls, "seconds": time spent in them}
+_rule_stats: Dict[str, Dict[str, float]] = {}
+
+
+def rule_stats(reset: bool = False) -> Dict[str, Dict[str, float]]:
+    """Per-rule timing counters for this process (and any merged from workers)"""
+    stats = {name: dict(counters) for name, counters in _rule_stats.items()}
+    if reset:
+        _rule_stats.clear()
+    return stats
+
+
+def merge_rule_stats(stats: Dict[str, Dict[str, float]]) -> None:
+    """Add counters collected in another process"""
+    for name, counters in stats.items():
+        totals = _rule_stats.setdefault(name, {"calls": 0, "seconds": 0.0})
+        totals["calls"] += counters["calls"]
+        totals["seconds"] += counters["seconds"]
+
+
+class Rule:
+    """A Python lint rule
+    
+    The analyzer calls visit() for every node that is an instance of one of
+    `node_types`, in source order, then finish() once the walk is complete.
+    A fresh instance is created for each analysis, so rules may keep state.
+    """
+    name = ""
+    node_types: Tuple[type, ...] = ()
+
+    def visit(self, node: ast.AST, report: "PythonASTAnalyzer") -> None:
+        pass
+
+    def finish(self, report: "PythonASTAnalyzer") -> None:
+        pass
+
+
+# Rules run by analyze_python, in registration order. Adding or changing a
+# rule changes its output, so bump analyze_python's cache version too.
+PYTHON_RULES: List[Type[Rule]] = []
+
+
+def python_rule(cls: Type[Rule]) -> Type[Rule]:
+    """Class decorator registering a rule with analyze_python"""
+    PYTHON_RULES.append(cls)
+    return cls
+
+
+@python_rule
+class DocstringRule(Rule):
+    """Functions and classes should have a docstring"""
+    name = "docstring"
+    node_types = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+    def visit(self, node, report):
+        if not ast.get_docstring(node):
+            kind = "Class" if isinstance(node, ast.ClassDef) else "Function"
+            report.suggestions.append({
+                "line": node.lineno,
+                "message": f"{kind} '{node.name}' lacks a docstring",
+                "type": "Documentation"
+            })
+
+
+@python_rule
+class MissingImportRule(Rule):
+    """Common modules used without being imported or defined"""
+    name = "missing_import"
+    node_types = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Name)
+
+    def __init__(self):
+        self.imported_names = set()
+        self.defined_names = set()
+        self.first_use: Dict[str, int] = {}
+
+    def visit(self, node, report):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                # `import os.path` binds `os`; `import numpy as np` binds `np`
+                self.imported_names.add(alias.asname or alias.name.split('.')[0])
+        elif isinstance(node, ast.ImportFrom):
+            if node.module:
+                self.imported_names.add(node.module.split('.')[0])
+            for alias in node.names:
+                self.imported_names.add(alias.asname or alias.name)
+        elif isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                self.first_use.setdefault(node.id, node.lineno)
+            elif isinstance(node.ctx, ast.Store):
+                self.defined_names.add(node.id)
+        else:
+            self.defined_names.add(node.name)
+
+    def finish(self, report):
+        missing = [
+            name for name in self.first_use.keys() & COMMON_MODULES
+            if name not in self.imported_names and name not in self.defined_names
+        ]
+        for name in sorted(missing, key=self.first_use.get):
+            report.warnings.append({
+                "line": self.first_use[name],
+                "message": f"Potentially missing import: {name}",
+                "type": "MissingImport",
+                "name": name
+            })
+
+
+@python_rule
+class MainGuardRule(Rule):
+    """Code with calls at statement level should sit behind a main guard"""
+    name = "main_guard"
+    node_types = (ast.If, ast.Expr)
+
+    def __init__(self):
+        self.has_main_guard = False
+        self.has_executable_code = False
+
+    def visit(self, node, report):
+        if isinstance(node, ast.Expr):
+            if isinstance(node.value, ast.Call):
+                self.has_executable_code = True
+        elif isinstance(node.test, ast.Compare):
+            test = node.test
+            if isinstance(test.left, ast.Name) and test.left.id == "__name__":
+                if any(isinstance(op, ast.Eq) for op in test.ops):
+                    if any(isinstance(comp, ast.Constant) and comp.value == "__main__"
+                           for comp in test.comparators):
+                        self.has_main_guard = True
+
+    def finish(self, report):
+        if not self.has_main_guard and self.has_executable_code:
+            report.suggestions.append({
+                "message": "Consider adding 'if __name__ == \"__main__\":' guard for executable code",
+                "type": "Structure"
+            })
+
+
+class PythonASTAnalyzer:
+    """Runs a set of rules over a Python AST in a single walk
+
+    Each node is routed only to the rules whose node_types match it, and
+    the time spent in each rule is added to the rule_stats() counters.
+    """
+
+    def __init__(self, rules: Optional[List[Type[Rule]]] = None):
+        self.warnings = []
+        self.suggestions = []
+        self.rules = [rule() for rule in (PYTHON_RULES if rules is None else rules)]
+        self._dispatch: Dict[type, Tuple[Rule, ...]] = {}
+        self._calls = {rule.name: 0 for rule in self.rules}
+        self._seconds = {rule.name: 0.0 for rule in self.rules}
+
+    def _rules_for(self, node_type: type) -> Tuple[Rule, ...]:
+        rules = self._dispatch.get(node_type)
+        if rules is None:
+            rules = tuple(rule for rule in self.rules if issubclass(node_type, rule.node_types))
+            self._dispatch[node_type] = rules
+        return rules
+
+    def visit(self, tree: ast.AST) -> None:
+        """Walk the tree depth-first in source order, dispatching each node"""
+        calls, seconds = self._calls, self._seconds
+        clock = time.perf_counter
+        dispatch = self._dispatch
+        stack = [tree]
+        push = stack.append
+        while stack:
+            node = stack.pop()
+            rules = dispatch.get(type(node))
+            if rules is None:
+                rules = self._rules_for(type(node))
+            for rule in rules:
+                start = clock()
+                rule.visit(node, self)
+                seconds[rule.name] += clock() - start
+                calls[rule.name] += 1
+            # Children pushed in reverse so they pop in source order
+            for field in reversed(node._fields):
+                value = getattr(node, field, None)
+                if isinstance(value, list):
+                    for item in reversed(value):
+                        if isinstance(item, ast.AST):
+                            push(item)
+                elif isinstance(value, ast.AST):
+                    push(value)
+
+    def finish(self) -> None:
+        """Evaluate the whole-module rules once the walk is complete and record timings"""
+        for rule in self.rules:
+            start = time.perf_counter()
+            rule.finish(self)
+            self._seconds[rule.name] += time.perf_counter() - start
+            self._calls[rule.name] += 1
+        merge_rule_stats({
+            name: {"calls": self._calls[name], "seconds": self._seconds[name]} for name in self._calls
+        })
+
+
+@cached_analysis("python", version=1)
+def analyze_python(code: str) -> Dict[str, Any]:
+    """
+    Check Python code for syntax errors and potential issues
+
+    Args:
+        code: Python code string to analyze
+
+    Returns:
+        Dictionary with valid, errors, warnings and suggestions
+    """
+    results = {
+        "valid": True,
+        "errors": [],
+        "warnings": [],
+        "suggestions": []
+    }
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        results["valid"] = False
+        results["errors"].append({
+            "line": e.lineno,
+            "column": e.offset,
+            "message": e.msg,
+            "type": "SyntaxError"
+        })
+        return results
+    except Exception as e:
+        # ValueError for null bytes, RecursionError/MemoryError for pathological input
+        results["valid"] = False
+        results["errors"].append({
+            "message": str(e),
+            "type": "ParseError"
+        })
+        return results
+
+    analyzer = PythonASTAnalyzer()
+    analyzer.visit(tree)
+    analyzer.finish()
+
+    results["warnings"].extend(analyzer.warnings)
+    results["suggestions"].extend(analyzer.suggestions)
+    return results
+
+
+def _ends_expression(token: Token) -> bool:
+    """Whether a statement could end at this token (so ASI may apply after it)"""
+    if token.kind == "name":
+        return token.value not in JS_KEYWORDS
+    if token.kind == "punct":
+        return token.value in (")", "]")
+    if token.kind == "template":
+        return token.value.endswith("`")
+    return token.kind in ("number", "string", "regex")
+
+
+@cached_analysis("javascript", version=3)
+def analyze_javascript(code: str) -> Dict[str, Any]:
+    """
+    Check JavaScript/TypeScript code from a single token stream
+
+    Brackets inside strings, comments, regex and template literals and
+    JSX element text are ignored. Semicolon hints only flag the places where automatic semicolon
+    insertion does not do what a missing semicolon suggests: a line starting
+    with ( [ or a template literal continues the previous statement, and a
+    line break after `return` returns undefined.
+
+    Args:
+        code: JavaScript/TypeScript code string to analyze
+
+    Returns:
+        Dictionary with valid, errors, warnings and suggestions
+    """
+    results = {
+        "valid": True,
+        "errors": [],
+        "warnings": [],
+        "suggestions": []
+    }
+
+    tokens, lex_errors = tokenize(code)
+    results["errors"].extend(lex_errors)
+
+    closing = {')': '(', ']': '[', '}': '{'}
+    stack = []
+    debug_lines = set()
+    console_logs = []
+    previous = None
+    before_previous = None
+
+    for token in tokens:
+        if token.kind == "comment":
+            if token.value.startswith("//") and "debug" in token.value.lower():
+                debug_lines.add(token.line)
+            continue
+
+        # Check for balanced brackets
+        if token.kind == "punct":
+            if token.value in ("(", "[", "{"):
+                stack.append(token)
+            elif token.value in closing:
+                if not stack:
+                    results["errors"].append({
+                        "line": token.line,
+                        "position": token.pos,
+                        "message": f"Unmatched closing bracket '{token.value}'",
+                        "type": "BracketError"
+                    })
+                else:
+                    opening = stack.pop()
+                    if closing[token.value] != opening.value:
+                        results["errors"].append({
+                            "line": token.line,
+                            "position": token.pos,
+                            "message": f"Mismatched brackets: '{opening.value}' at line {opening.line} and '{token.value}' at line {token.line}",
+                            "type": "BracketError"
+                        })
+
+        elif token.kind == "name":
+            if previous is not None and previous.value in (".", "?."):
+                if token.value == "log" and before_previous is not None and before_previous.value == "console":
+                    console_logs.append(token.line)
+            elif token.value == "var":
+                # Check for var usage (suggest let/const)
+                results["suggestions"].append({
+                    "line": token.line,
+                    "message": "Consider using 'let' or 'const' instead of 'var'",
+                    "type": "ModernJS"
+                })
+
+        # Automatic semicolon insertion hazards
+        if token.newline_before and previous is not None:
+            starts_continuation = (token.kind == "punct" and token.value in ("(", "[")) or \
+                (token.kind == "template" and token.value.startswith("`"))
+            if starts_continuation and _ends_expression(previous):
+                results["warnings"].append({
+                    "line": previous.line,
+                    "message": f"Possible missing semicolon at line {previous.line}: "
+                               f"line {token.line} starts with '{token.value[0]}' and continues the statement",
+                    "type": "ASI"
+                })
+            elif previous.kind == "name" and previous.value == "return" and token.value not in (";", "}"):
+                results["warnings"].append({
+                    "line": previous.line,
+                    "message": f"Line break after 'return' at line {previous.line} returns undefined",
+                    "type": "ASI"
+                })
+
+        before_previous, previous = previous, token
+
+    for token in stack:
+        results["errors"].append({
+            "line": token.line,
+            "position": token.pos,
+            "message": f"Unclosed bracket '{token.value}'",
+            "type": "BracketError"
+        })
+
+    # Check for console.log in production code
+    for line in console_logs:
+        if line not in debug_lines:
+            results["warnings"].append({
+                "line": line,
+                "message": "console.log found - consider removing for production",
+                "type": "DebugCode"
+            })
+
+    results["valid"] = not results["errors"]
+    return results
+
+
+def summarize_javascript_issues(results: Dict[str, Any]) -> List[str]:
+    """One-line messages for the problems reported in ChatResponse.error_details"""
+    issues = [f"Line {error['line']}: {error['message']}" for error in results["errors"]]
+    issues.extend(warning["message"] for warning in results["warnings"] if warning["type"] == "ASI")
+    return issues
+
+
+def summarize_python_issues(results: Dict[str, Any]) -> List[str]:
+    """One-line messages for the problems reported in ChatResponse.error_details"""
+    issues = []
+    for error in results["errors"]:
+        if error["type"] == "SyntaxError":
+            issues.append(f"Syntax error at line {error['line']}: {error['message']}")
+        else:
+            issues.append(f"Parse error: {error['message']}")
+    for warning in results["warnings"]:
+        if warning["type"] == "MissingImport":
+            issues.append(f"Missing import: {warning['name']}")
+    return issues
+
+
+# Code block language -> memoized analyzer
+ANALYZERS: Dict[str, Callable[[str], Dict[str, Any]]] = {
+    "python": analyze_python,
+    "javascript": analyze_javascript,
+    "js": analyze_javascript,
+    "typescript": analyze_javascript,
+    "ts": analyze_javascript,
+}
+
+
+def summarize_issues(language: str, results: Dict[str, Any]) -> List[str]:
+    """error_details lines for an analysis result of the given language"""
+    if ANALYZERS.get(language) is analyze_python:
+        return summarize_python_issues(results)
+    return summarize_javascript_issues(results)
@@ -0,0 +1,196 @@
+"""
+Process-pool code analysis for the Coding AI Assistant
+Runs analyzers outside the event loop process with per-snippet size and time budgets
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List, Dict, Any, Tuple
+
+from analysis import ANALYZERS, analysis_cache, rule_stats, merge_rule_stats
+from code_blocks import CodeFenceParser
+
+logger = logging.getLogger(__name__)
+
+
+def _run_analyzer(language: str, code: str) -> Tuple[Dict[str, Any], Dict[str, Dict[str, float]]]:
+    """Worker entry point; bypasses the cache, which lives in the parent process
+
+    Returns the result and the rule timings collected since the last call,
+    which the parent merges into its own counters.
+    """
+    return ANALYZERS[language].uncached(code), rule_stats(reset=True)
+
+
+def skipped_result(reason: str) -> Dict[str, Any]:
+    """Placeholder result for a snippet that was not analyzed"""
+    return {"valid": True, "skipped": reason, "errors": [], "warnings": [], "suggestions": []}
+
+
+class AnalysisPool:
+    """Analyzes code snippets in worker processes
+
+    Cached results are returned without touching the pool. Snippets over
+    max_code_bytes are skipped outright; a snippet still running after
+    `timeout` seconds is reported as skipped and the pool is recycled, since
+    a worker stuck in the parser cannot be interrupted any other way.
+    """
+
+    def __init__(self, max_workers: int = 2, timeout: float = 2.0, max_code_bytes: int = 200_000):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_code_bytes = max_code_bytes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._warming: Optional[asyncio.Future] = None
+        # At most one snippet per worker in flight, so the timeout measures analysis rather than queueing
+        self._slots = asyncio.Semaphore(max_workers)
+
+        # Monitoring counters
+        self.analyzed = 0
+        self.cache_hits = 0
+        self.skipped_size = 0
+        self.skipped_timeout = 0
+        self.skipped_error = 0
+        self.recycles = 0
+
+    def start(self) -> None:
+        """Start the worker processes; called on startup and after each recycle"""
+        if self._executor is not None:
+            return
+        # spawn: workers must not inherit the server's threads and locks
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        # Spawned workers re-import the main module; that startup time must not count against a snippet's timeout
+        loop = asyncio.get_running_loop()
+        self._warming = asyncio.gather(*(
+            loop.run_in_executor(self._executor, _run_analyzer, "python", "") for _ in range(self.max_workers)
+        ))
+
+    async def _pool(self) -> ProcessPoolExecutor:
+        self.start()
+        executor = self._executor
+        await asyncio.shield(self._warming)
+        return executor
+
+    def _recycle(self) -> None:
+        """Kill the workers (including any stuck one) and start a fresh pool on next use"""
+        executor, self._executor = self._executor, None
+        self._warming = None
+        if executor is None:
+            return
+        # ProcessPoolExecutor has no per-task cancellation for running work
+        for process in list(getattr(executor, "_processes", {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def analyze(self, language: str, code: str) -> Optional[Dict[str, Any]]:
+        """Analyze one snippet; None if there is no analyzer for the language"""
+        analyzer = ANALYZERS.get(language)
+        if analyzer is None:
+            return None
+
+        key = analyzer.cache_key(code)
+        result = analysis_cache.get(key)
+        if result is not None:
+            self.cache_hits += 1
+            return result
+
+        if len(code.encode("utf-8", "surrogatepass")) > self.max_code_bytes:
+            self.skipped_size += 1
+            return skipped_result(f"code block larger than {self.max_code_bytes} bytes")
+
+        async with self._slots:
+            return await self._run(key, language, code)
+
+    async def _run(self, key: tuple, language: str, code: str) -> Dict[str, Any]:
+        executor = None
+        loop = asyncio.get_running_loop()
+        try:
+            executor = await self._pool()
+            result, timings = await asyncio.wait_for(
+                loop.run_in_executor(executor, _run_analyzer, language, code), timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            self.skipped_timeout += 1
+            logger.warning(f"Analysis of a {len(code)}-character {language} block timed out, recycling pool")
+            if self._executor is executor:
+                self.recycles += 1
+                self._recycle()
+            return skipped_result(f"analysis took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            # Another snippet's timeout recycled the pool, or a worker crashed
+            self.skipped_error += 1
+            if self._executor is executor:
+                self.recycles += 1
+                self._recycle()
+            return skipped_result("analysis worker stopped")
+
+        self.analyzed += 1
+        merge_rule_stats(timings)
+        analysis_cache.set(key, result)
+        return result
+
+    async def analyze_many(self, snippets: List[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """Analyze (language, code) snippets in parallel, preserving order"""
+        return await asyncio.gather(*(self.analyze(language, code) for language, code in snippets))
+
+    def streaming(self, analyze: bool = True) -> "StreamingAnalysis":
+        """Analyzer for a response that is still being generated; analyze=False only collects blocks"""
+        return StreamingAnalysis(self, analyze)
+
+    def shutdown(self) -> None:
+        self._recycle()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring"""
+        return {
+            "max_workers": self.max_workers,
+            "timeout_seconds": self.timeout,
+            "max_code_bytes": self.max_code_bytes,
+            "analyzed": self.analyzed,
+            "cache_hits": self.cache_hits,
+            "skipped_size": self.skipped_size,
+            "skipped_timeout": self.skipped_timeout,
+            "skipped_error": self.skipped_error,
+            "recycles": self.recycles,
+        }
+
+
+class StreamingAnalysis:
+    """Starts analyzing each code block of a streamed response as soon as it is closed
+
+    Analysis overlaps with the rest of generation, so results are usually
+    ready when the last token arrives.
+    """
+
+    def __init__(self, pool: AnalysisPool, analyze: bool = True):
+        self.pool = pool
+        self.analyze = analyze
+        self.parser = CodeFenceParser()
+        self._tasks: List[asyncio.Future] = []
+
+    @property
+    def blocks(self) -> List[Dict[str, str]]:
+        return self.parser.blocks
+
+    def feed(self, chunk: str) -> None:
+        """Add a streamed token"""
+        blocks = self.parser.feed(chunk)
+        if not self.analyze:
+            return
+        for block in blocks:
+            self._tasks.append(asyncio.ensure_future(self.pool.analyze(block["language"], block["code"])))
+
+    async def results(self) -> List[Optional[Dict[str, Any]]]:
+        """Analysis results for every block, in order"""
+        return await asyncio.gather(*self._tasks)
+
+    def cancel(self) -> None:
+        """Abandon analysis when the response is not going to be used"""
+        for task in self._tasks:
+            task.cancel()
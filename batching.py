@@ -0,0 +1,334 @@
+"""
+Continuous batching scheduler for the Coding AI Assistant
+Interleaves decode steps of several in-flight generations in one llama.cpp batch
+"""
+
+import codecs
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Smoothing factor for the TTFT moving average
+_EWMA_ALPHA = 0.2
+
+
+class BatchRequest:
+    """One generation tracked by the scheduler
+
+    Events are delivered through emit(event, payload) on the inference thread:
+    ("token", text) for each text fragment, ("error", exception) on failure,
+    and always a final ("done", None).
+    """
+
+    def __init__(self, prompt: str, params: Dict[str, Any], emit: Callable[[str, Any], None]):
+        self.prompt = prompt
+        self.max_tokens = params.get("max_tokens") or 16
+        self.temperature = params.get("temperature", 0.8)
+        self.top_p = params.get("top_p", 0.95)
+        stop = params.get("stop") or []
+        self.stop: List[str] = [stop] if isinstance(stop, str) else list(stop)
+        self.emit = emit
+        self.cancelled = threading.Event()
+
+        # Scheduler state
+        self.seq_id: Optional[int] = None
+        self.pending: List[int] = []  # Prompt tokens not yet evaluated
+        self.n_past = 0
+        self.n_prompt = 0
+        self.n_generated = 0
+        self.kv_reserved = 0
+        self.last_token: Optional[int] = None
+        self.logits_index: Optional[int] = None
+        self.text = ""
+        self.emitted = 0
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self.submitted_at = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.finish_reason: Optional[str] = None
+
+
+class BatchScheduler:
+    """Continuous batching over llama.cpp sequences
+
+    Each in-flight request owns a KV-cache sequence id. Every step builds one
+    llama_batch holding the next token of each decoding request plus prompt
+    chunks of newly admitted ones, so requests join between steps instead of
+    waiting for the current generation to finish. run() must execute on the
+    thread that owns the Llama instance.
+    """
+
+    def __init__(self, llm, max_sequences: int = 4, seed: Optional[int] = None):
+        import numpy
+        import llama_cpp
+
+        self.llm = llm
+        self.max_sequences = max_sequences
+        self.n_batch = llm.n_batch
+        self.n_ctx = llm.n_ctx()
+        self.n_vocab = llm.n_vocab()
+        self.eos_token = llm.token_eos()
+        self._np = numpy
+        self._llama_cpp = llama_cpp
+        self._rng = numpy.random.default_rng(seed)
+        self._batch = llama_cpp.llama_batch_init(self.n_batch, 0, max_sequences)
+
+        self._lock = threading.Lock()
+        self._incoming: "deque[BatchRequest]" = deque()
+        self._running = False
+        self._active: Dict[int, BatchRequest] = {}
+        self._free_seqs = list(range(max_sequences))
+        self._kv_used = 0
+
+        # Monitoring counters
+        self.steps = 0
+        self.tokens_generated = 0
+        self.busy_seconds = 0.0
+        self.batch_tokens = 0
+        self.avg_ttft_seconds = 0.0
+        self.last_ttft_seconds = 0.0
+
+    def submit(self, request: BatchRequest) -> bool:
+        """Queue a request; returns True if the caller must start run() on the inference thread"""
+        with self._lock:
+            self._incoming.append(request)
+            if self._running:
+                return False
+            self._running = True
+            return True
+
+    def run(self) -> None:
+        """Step until no request is queued or in flight (runs on the inference thread)"""
+        # The high-level Llama API may have left tokens in the KV cache
+        self.llm.reset()
+        self._llama_cpp.llama_kv_cache_clear(self.llm.ctx)
+        started = time.monotonic()
+        try:
+            while True:
+                with self._lock:
+                    if not self._incoming and not self._active:
+                        self._running = False
+                        return
+                try:
+                    self._step()
+                except Exception as e:
+                    logger.error(f"Batch decode failed: {e}")
+                    self._fail_all(e)
+        finally:
+            self.busy_seconds += time.monotonic() - started
+
+    def _fail_all(self, error: Exception) -> None:
+        for request in list(self._active.values()):
+            request.emit("error", error)
+            self._retire(request, "error")
+
+    def _admit(self) -> None:
+        """Move queued requests into free sequences while KV cache space allows"""
+        while self._free_seqs:
+            with self._lock:
+                if not self._incoming:
+                    return
+                request = self._incoming[0]
+                if request.cancelled.is_set():
+                    self._incoming.popleft()
+                    request.finish_reason = "cancelled"
+                    request.emit("done", None)
+                    continue
+                try:
+                    tokens = self.llm.tokenize(request.prompt.encode("utf-8"))
+                    reserve = len(tokens) + request.max_tokens
+                    if reserve > self.n_ctx:
+                        raise ValueError(f"Requested {reserve} tokens exceed context window of {self.n_ctx}")
+                except Exception as e:
+                    self._incoming.popleft()
+                    request.finish_reason = "error"
+                    request.emit("error", e)
+                    request.emit("done", None)
+                    continue
+                if self._kv_used + reserve > self.n_ctx:
+                    # Wait for running sequences to free KV cells
+                    return
+                self._incoming.popleft()
+
+            request.seq_id = self._free_seqs.pop()
+            request.pending = tokens
+            request.n_prompt = len(tokens)
+            request.kv_reserved = reserve
+            self._kv_used += reserve
+            self._active[request.seq_id] = request
+
+    def _add(self, index: int, token: int, pos: int, seq_id: int, logits: bool) -> None:
+        batch = self._batch
+        batch.token[index] = token
+        batch.pos[index] = pos
+        batch.seq_id[index][0] = seq_id
+        batch.n_seq_id[index] = 1
+        batch.logits[index] = logits
+
+    def _fill(self, limit: int) -> Tuple[int, List[BatchRequest], List[Tuple[BatchRequest, int]]]:
+        """Put up to `limit` tokens into the batch: decode tokens first, then prompt chunks
+
+        Returns (tokens added, decoding requests, [(request, prompt tokens taken)]).
+        Request state is left untouched until the batch has been decoded.
+        """
+        n = 0
+        decoding = []
+        chunks = []
+        for request in self._active.values():
+            request.logits_index = None
+        # One token for every sequence already past its prompt
+        for request in self._active.values():
+            if n >= limit:
+                break
+            if not request.pending and request.last_token is not None:
+                self._add(n, request.last_token, request.n_past, request.seq_id, True)
+                request.logits_index = n
+                decoding.append(request)
+                n += 1
+        # Fill the rest of the batch with prompt chunks
+        for request in self._active.values():
+            if not request.pending or n >= limit:
+                continue
+            take = min(len(request.pending), limit - n)
+            for j, token in enumerate(request.pending[:take]):
+                last = j == take - 1 and take == len(request.pending)
+                self._add(n, token, request.n_past + j, request.seq_id, last)
+                if last:
+                    request.logits_index = n
+                n += 1
+            chunks.append((request, take))
+        return n, decoding, chunks
+
+    def _step(self) -> None:
+        """Build and decode one batch, then sample the next token of each ready sequence"""
+        self._admit()
+
+        for request in list(self._active.values()):
+            if request.cancelled.is_set():
+                self._retire(request, "cancelled")
+
+        limit = self.n_batch
+        while True:
+            n, decoding, chunks = self._fill(limit)
+            if n == 0:
+                return
+            self._batch.n_tokens = n
+            result = self._llama_cpp.llama_decode(self.llm.ctx, self._batch)
+            if result == 0:
+                break
+            if result < 0:
+                raise RuntimeError(f"llama_decode returned {result}")
+
+            # No free KV slot for the whole batch: drop anything it wrote, then retry with half
+            # the tokens, which defers prompt chunks before any sequence's next token
+            batched = decoding + [request for request, _ in chunks]
+            for request in batched:
+                self._llama_cpp.llama_kv_cache_seq_rm(self.llm.ctx, request.seq_id, request.n_past, -1)
+            if n == 1:
+                # Not even one token fits; free this sequence's cells so the others can continue
+                request = batched[0]
+                request.emit("error", RuntimeError(f"llama_decode returned {result}: no KV cache slot"))
+                self._retire(request, "error")
+                return
+            limit = n // 2
+            logger.warning(f"llama_decode returned {result} for {n} tokens, retrying with {limit}")
+
+        self.steps += 1
+        self.batch_tokens += n
+        for request in decoding:
+            request.n_past += 1
+        for request, take in chunks:
+            request.pending = request.pending[take:]
+            request.n_past += take
+
+        for request in list(self._active.values()):
+            if request.logits_index is not None:
+                self._accept(request, self._sample(request))
+
+    def _sample(self, request: BatchRequest) -> int:
+        """Sample the next token with temperature and top-p"""
+        np = self._np
+        pointer = self._llama_cpp.llama_get_logits_ith(self.llm.ctx, request.logits_index)
+        logits = np.ctypeslib.as_array(pointer, shape=(self.n_vocab,)).astype(np.float64)
+        if request.temperature <= 0:
+            return int(np.argmax(logits))
+        logits /= request.temperature
+        probs = np.exp(logits - logits.max())
+        probs /= probs.sum()
+        if request.top_p < 1.0:
+            order = np.argsort(-probs)
+            cutoff = int(np.searchsorted(np.cumsum(probs[order]), request.top_p)) + 1
+            keep = order[:cutoff]
+            return int(self._rng.choice(keep, p=probs[keep] / probs[keep].sum()))
+        return int(self._rng.choice(self.n_vocab, p=probs))
+
+    def _accept(self, request: BatchRequest, token: int) -> None:
+        """Record a sampled token, emit safe text and retire finished requests"""
+        if request.first_token_at is None:
+            request.first_token_at = time.monotonic()
+            self.last_ttft_seconds = request.first_token_at - request.submitted_at
+            self.avg_ttft_seconds = (self.last_ttft_seconds if self.avg_ttft_seconds == 0.0 else
+                                     self.avg_ttft_seconds + _EWMA_ALPHA * (self.last_ttft_seconds - self.avg_ttft_seconds))
+
+        if token == self.eos_token:
+            self._retire(request, "stop")
+            return
+
+        request.n_generated += 1
+        self.tokens_generated += 1
+        request.last_token = token
+        request.text += request.decoder.decode(self.llm.detokenize([token]))
+
+        for stop in request.stop:
+            position = request.text.find(stop, max(0, request.emitted - len(stop)))
+            if position >= 0:
+                request.text = request.text[:position]
+                self._retire(request, "stop")
+                return
+
+        if request.n_generated >= request.max_tokens:
+            self._retire(request, "length")
+            return
+
+        # Hold back any suffix that could still grow into a stop sequence
+        holdback = 0
+        for stop in request.stop:
+            for size in range(min(len(stop) - 1, len(request.text)), holdback, -1):
+                if request.text.endswith(stop[:size]):
+                    holdback = size
+                    break
+        safe = len(request.text) - holdback
+        if safe > request.emitted:
+            request.emit("token", request.text[request.emitted:safe])
+            request.emitted = safe
+
+    def _retire(self, request: BatchRequest, finish_reason: str) -> None:
+        """Flush remaining text, free the sequence and signal completion"""
+        if request.finish_reason is not None:
+            return
+        request.finish_reason = finish_reason
+        if finish_reason != "error" and len(request.text) > request.emitted:
+            request.emit("token", request.text[request.emitted:])
+            request.emitted = len(request.text)
+        self._llama_cpp.llama_kv_cache_seq_rm(self.llm.ctx, request.seq_id, -1, -1)
+        self._active.pop(request.seq_id, None)
+        self._free_seqs.append(request.seq_id)
+        self._kv_used -= request.kv_reserved
+        request.emit("done", None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Aggregate throughput and per-request TTFT for monitoring"""
+        return {
+            "max_sequences": self.max_sequences,
+            "active_sequences": len(self._active),
+            "queued": len(self._incoming),
+            "steps": self.steps,
+            "avg_batch_tokens": round(self.batch_tokens / self.steps, 2) if self.steps else 0.0,
+            "aggregate_tokens_per_second": round(self.tokens_generated / self.busy_seconds, 2)
+            if self.busy_seconds else 0.0,
+            "avg_ttft_seconds": round(self.avg_ttft_seconds, 3),
+            "last_ttft_seconds": round(self.last_ttft_seconds, 3),
+        }
@@ -0,0 +1,59 @@
+"""
+Code block extraction for the Coding AI Assistant
+Finds ``` fenced blocks in a complete response or incrementally as tokens stream in
+"""
+
+import re
+from typing import List, Dict
+
+CODE_BLOCK_PATTERN = re.compile(r'```(\w+)?\n(.*?)```', re.DOTALL)
+
+
+def _block(match: re.Match) -> Dict[str, str]:
+    return {
+        "language": match.group(1) or "plaintext",
+        "code": match.group(2).strip()
+    }
+
+
+class CodeFenceParser:
+    """Reports each code block as soon as its closing fence arrives
+
+    Feeding a text in any number of pieces yields the same blocks, in the
+    same order, as extract_code_blocks on the whole text. A block can only
+    be completed by a backtick, so pieces without one are just buffered, and
+    text before the next ``` is never scanned again.
+    """
+
+    def __init__(self):
+        self.blocks: List[Dict[str, str]] = []
+        self._parts: List[str] = []
+        self._text = ""
+        self._pos = 0  # No block can start before this offset
+
+    def feed(self, chunk: str) -> List[Dict[str, str]]:
+        """Add streamed text; returns the blocks it completed"""
+        self._parts.append(chunk)
+        if "`" not in chunk:
+            return []
+
+        self._text += "".join(self._parts)
+        self._parts.clear()
+        completed = []
+        while True:
+            match = CODE_BLOCK_PATTERN.search(self._text, self._pos)
+            if match is None:
+                break
+            completed.append(_block(match))
+            self._pos = match.end()
+
+        # Skip ahead to the next possible opening fence, keeping a partial one at the end
+        fence = self._text.find("```", self._pos)
+        self._pos = fence if fence >= 0 else max(self._pos, len(self._text) - 2)
+        self.blocks.extend(completed)
+        return completed
+
+
+def extract_code_blocks(text: str) -> List[Dict[str, str]]:
+    """Extract code blocks from text"""
+    return [_block(match) for match in CODE_BLOCK_PATTERN.finditer(text)]
@@ -0,0 +1,255 @@
+"""
+Model downloader for the Coding AI Assistant
+Streams to a .part file with HTTP Range resume, optional parallel byte ranges,
+streaming SHA-256 verification and an atomic rename on success
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Callable, List, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB read size when hashing files on disk
+
+
+class DownloadError(Exception):
+    """Raised when a download cannot be completed or fails verification"""
+
+
+class DownloadCancelled(DownloadError):
+    """Raised when the stop event is set; the .part file is kept for resuming"""
+
+
+def _check_stop(stop: Optional[threading.Event]) -> None:
+    if stop is not None and stop.is_set():
+        raise DownloadCancelled("Download cancelled")
+
+
+def _part_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".part")
+
+
+def _ranges_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".part.ranges")
+
+
+def _probe(client: httpx.Client, url: str) -> Tuple[Optional[int], bool]:
+    """Return (content length, whether byte ranges are supported)"""
+    try:
+        response = client.head(url)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning(f"HEAD request failed, downloading without size information: {e}")
+        return None, False
+    length = response.headers.get("content-length")
+    accepts_ranges = response.headers.get("accept-ranges", "").lower() == "bytes"
+    return (int(length) if length else None), accepts_ranges
+
+
+def _hash_file(path: Path, digest=None, chunk_size: int = CHUNK_SIZE):
+    """Feed a file into a SHA-256 digest in chunks"""
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest
+
+
+def _download_sequential(client: httpx.Client, url: str, part: Path, total: Optional[int],
+                         progress: Optional[Callable[[int], None]], stop: Optional[threading.Event] = None):
+    """Append to the .part file from its current size, hashing as bytes arrive
+
+    Returns the SHA-256 digest of the whole file.
+    """
+    existing = part.stat().st_size if part.exists() else 0
+    if total is not None and existing > total:
+        part.unlink()
+        existing = 0
+
+    digest = _hash_file(part) if existing else hashlib.sha256()
+    if progress and existing:
+        progress(existing)
+    if total is not None and existing == total:
+        return digest
+
+    headers = {"Range": f"bytes={existing}-"} if existing else {}
+    with client.stream("GET", url, headers=headers) as response:
+        if response.status_code == 416:
+            # Nothing left to fetch; size and hash are checked by the caller
+            return digest
+        response.raise_for_status()
+        if existing and response.status_code != 206:
+            # Server ignored the Range header; start over
+            logger.info("Server does not support resume, restarting download")
+            existing = 0
+            digest = hashlib.sha256()
+        with open(part, "ab" if existing else "wb") as f:
+            for chunk in response.iter_bytes():
+                _check_stop(stop)
+                f.write(chunk)
+                digest.update(chunk)
+                if progress:
+                    progress(len(chunk))
+    return digest
+
+
+def _download_parallel(client: httpx.Client, url: str, dest: Path, part: Path, total: int,
+                       connections: int, progress: Optional[Callable[[int], None]],
+                       stop: Optional[threading.Event] = None) -> None:
+    """Fetch byte ranges concurrently into a preallocated .part file
+
+    Per-range progress is kept in a .part.ranges file so an interrupted
+    download resumes each range where it stopped.
+    """
+    ranges_file = _ranges_path(dest)
+    ranges: List[List[int]] = []
+    if part.exists() and ranges_file.exists():
+        try:
+            state = json.loads(ranges_file.read_text())
+            if state.get("size") == total:
+                ranges = state["ranges"]
+        except (ValueError, KeyError):
+            ranges = []
+    if not ranges:
+        segment = -(-total // connections)
+        ranges = [[start, min(start + segment, total) - 1, 0] for start in range(0, total, segment)]
+        with open(part, "wb") as f:
+            f.truncate(total)
+
+    lock = threading.Lock()
+    last_saved = [time.monotonic()]
+
+    def save_state(force: bool = False) -> None:
+        # Called with lock held
+        now = time.monotonic()
+        if force or now - last_saved[0] > 1.0:
+            ranges_file.write_text(json.dumps({"size": total, "ranges": ranges}))
+            last_saved[0] = now
+
+    if progress:
+        progress(sum(done for _, _, done in ranges))
+
+    def fetch(byte_range: List[int]) -> None:
+        start, end, _ = byte_range
+        if start + byte_range[2] > end:
+            return
+        headers = {"Range": f"bytes={start + byte_range[2]}-{end}"}
+        with client.stream("GET", url, headers=headers) as response:
+            if response.status_code != 206:
+                raise DownloadError(f"Range request returned {response.status_code}")
+            with open(part, "r+b") as f:
+                f.seek(start + byte_range[2])
+                for chunk in response.iter_bytes():
+                    _check_stop(stop)
+                    f.write(chunk)
+                    with lock:
+                        byte_range[2] += len(chunk)
+                        save_state()
+                    if progress:
+                        progress(len(chunk))
+
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as pool:
+            for future in [pool.submit(fetch, byte_range) for byte_range in ranges]:
+                future.result()
+    finally:
+        with lock:
+            save_state(force=True)
+
+    if any(start + done <= end for start, end, done in ranges):
+        raise DownloadError("Download incomplete")
+    ranges_file.unlink()
+
+
+def download_file(url: str, dest: Path, expected_sha256: Optional[str] = None,
+                  headers: Optional[Dict[str, str]] = None, connections: int = 1,
+                  retries: int = 3, timeout: float = 300.0, chunk_size: int = CHUNK_SIZE,
+                  progress: Optional[Callable[[int], None]] = None,
+                  total_callback: Optional[Callable[[Optional[int]], None]] = None,
+                  stop: Optional[threading.Event] = None) -> Path:
+    """
+    Download a file without buffering it in memory
+
+    Bytes go to `<dest>.part`, which survives failures so the next attempt
+    resumes with a Range request. The file is only renamed to dest after the
+    size (and SHA-256, if given) checks pass.
+
+    Args:
+        url: Source URL
+        dest: Final file path
+        expected_sha256: Hex digest to verify, or None to skip verification
+        headers: Extra request headers (e.g. Authorization)
+        connections: Number of parallel byte-range connections
+        retries: Attempts before giving up; each attempt resumes the .part file
+        timeout: Per-request network timeout in seconds
+        chunk_size: Bytes read per iteration when hashing an existing file
+        progress: Called with the number of new bytes received
+        total_callback: Called once with the content length (or None)
+        stop: Event checked between chunks and during retry backoff; when set
+            the download stops (keeping the .part file) and raises DownloadCancelled
+
+    Returns:
+        Path of the downloaded file
+
+    Raises:
+        DownloadError: If the download fails or does not verify
+        DownloadCancelled: If `stop` was set
+    """
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    part = _part_path(dest)
+
+    with httpx.Client(headers=headers or {}, follow_redirects=True, timeout=timeout) as client:
+        total, accepts_ranges = _probe(client, url)
+        if total_callback:
+            total_callback(total)
+        parallel = connections > 1 and accepts_ranges and total is not None
+        if not parallel and _ranges_path(dest).exists():
+            # A preallocated parallel .part has holes and cannot be resumed sequentially
+            part.unlink(missing_ok=True)
+            _ranges_path(dest).unlink()
+
+        digest = None
+        for attempt in range(1, retries + 1):
+            try:
+                _check_stop(stop)
+                if parallel:
+                    _download_parallel(client, url, dest, part, total, connections, progress, stop)
+                else:
+                    digest = _download_sequential(client, url, part, total, progress, stop)
+                break
+            except DownloadCancelled:
+                raise
+            except (httpx.HTTPError, OSError, DownloadError) as e:
+                if attempt == retries:
+                    raise DownloadError(f"Download failed after {retries} attempts: {e}") from e
+                logger.warning(f"Download attempt {attempt} failed, resuming: {e}")
+                backoff = min(2 ** attempt, 30)
+                if stop is not None:
+                    stop.wait(backoff)
+                else:
+                    time.sleep(backoff)
+
+    size = part.stat().st_size
+    if total is not None and size != total:
+        raise DownloadError(f"Downloaded {size} bytes, expected {total}")
+
+    if expected_sha256:
+        if digest is None:
+            digest = _hash_file(part, chunk_size=chunk_size)
+        if digest.hexdigest().lower() != expected_sha256.lower():
+            # A corrupt file cannot be resumed into a good one
+            part.unlink()
+            raise DownloadError("SHA-256 mismatch, download discarded")
+
+    os.replace(part, dest)
+    return dest
@@ -0,0 +1,21 @@
+#!/bin/bash
+
+# Container entrypoint: runs the shared inference server (the only process
+# holding the model) next to the API workers, and exits as soon as either
+# one dies so the platform restarts the whole container instead of leaving
+# the workers serving mock responses.
+
+python inference_server.py &
+inference_pid=$!
+
+uvicorn main:app --host 0.0.0.0 --port "${PORT}" --workers 2 &
+api_pid=$!
+
+trap 'kill -TERM "$inference_pid" "$api_pid" 2>/dev/null' TERM INT
+
+wait -n "$inference_pid" "$api_pid"
+status=$?
+
+kill -TERM "$inference_pid" "$api_pid" 2>/dev/null
+wait
+exit "$status"
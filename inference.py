@@ -0,0 +1,487 @@
+"""
+Inference executor for the Coding AI Assistant
+Owns the language model and runs every model call off the asyncio event loop
+"""
+
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+from typing import Optional, Dict, Any, AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a token stream on the hand-off queue
+_STREAM_END = object()
+
+# Llama constructor arguments shared by the API process and the inference server
+DEFAULT_MODEL_KWARGS = {
+    "n_ctx": 4096,  # Context window
+    "n_threads": 2,  # Use 2 threads for low memory usage
+    "n_gpu_layers": 0,  # CPU only for Render free tier
+    "verbose": False,
+}
+
+# Smoothing factor for the moving averages of generation time and rate
+_EWMA_ALPHA = 0.2
+
+
+class InferenceOverloaded(Exception):
+    """Raised when a generation cannot start within the queue deadline"""
+
+    def __init__(self, retry_after: int, reason: str = "Inference queue is full"):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class PrefixStateCache:
+    """LRU cache of llama states saved right after evaluating a prompt prefix
+
+    Only touched from the inference thread, so it needs no locking.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._states: "OrderedDict[str, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def sizeof(state) -> int:
+        """Memory held by a saved state: the llama.cpp state plus the numpy copies of logits and input ids"""
+        return state.llama_state_size + state.scores.nbytes + state.input_ids.nbytes
+
+    def get(self, prefix: str):
+        """Return the saved state for a prefix, marking it most recently used"""
+        entry = self._states.get(prefix)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._states.move_to_end(prefix)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, prefix: str, state) -> None:
+        """Store a state, evicting least recently used entries over the memory cap"""
+        size = self.sizeof(state)
+        if size > self.max_bytes:
+            return
+        if prefix in self._states:
+            self.total_bytes -= self._states.pop(prefix)[1]
+        self._states[prefix] = (state, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._states.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def clear(self) -> None:
+        self._states.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._states),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class InferenceExecutor:
+    """Runs model loading and generation on a dedicated inference thread"""
+
+    def __init__(self, max_queue_depth: int = 8, queue_timeout: float = 30.0,
+                 prefix_cache_bytes: int = 128 * 1024 * 1024, batch_size: int = 1):
+        # llama.cpp contexts are not thread-safe, so a single thread owns the model
+        self.llm = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.prefix_cache = PrefixStateCache(prefix_cache_bytes) if prefix_cache_bytes > 0 else None
+
+        # With batch_size > 1, generations are interleaved by a BatchScheduler
+        self.batch_size = max(1, batch_size)
+        self.scheduler = None
+
+        # Admission control: batch_size generations run, at most max_queue_depth wait
+        self.max_queue_depth = max_queue_depth
+        self.queue_timeout = queue_timeout
+        self._slot = asyncio.Semaphore(self.batch_size)
+        self._waiting = 0
+        self._running = 0
+
+        # Monitoring counters
+        self.completed = 0
+        self.rejected = 0
+        self.avg_wait_seconds = 0.0
+        self.avg_generation_seconds = 0.0
+        self.tokens_per_second = 0.0
+
+    @property
+    def model_loaded(self) -> bool:
+        """Whether a model is available for generation"""
+        return self.llm is not None
+
+    @staticmethod
+    def _ewma(current: float, sample: float) -> float:
+        """Update an exponentially weighted moving average"""
+        return sample if current == 0.0 else current + _EWMA_ALPHA * (sample - current)
+
+    def estimated_wait(self) -> float:
+        """Estimated seconds until a newly queued request would start"""
+        return (self._waiting + self._running) / self.batch_size * self.avg_generation_seconds
+
+    def retry_after(self) -> int:
+        """Retry-After estimate in whole seconds, based on the measured generation time"""
+        if self.avg_generation_seconds == 0.0:
+            return max(1, math.ceil(self.queue_timeout))
+        return max(1, math.ceil(self.estimated_wait()))
+
+    def _reject(self, reason: str) -> InferenceOverloaded:
+        self.rejected += 1
+        logger.warning(f"Rejecting inference request: {reason} "
+                       f"(waiting={self._waiting}, running={self._running})")
+        return InferenceOverloaded(self.retry_after(), reason)
+
+    @asynccontextmanager
+    async def admission(self):
+        """
+        Wait for the generation slot, shedding load when the queue cannot drain in time
+
+        Raises:
+            InferenceOverloaded: If the queue is full, the predicted wait exceeds the
+                deadline, or the slot is not acquired before the deadline
+        """
+        started = time.monotonic()
+        if not self._slot.locked() and self._waiting == 0:
+            # Idle model: take the slot without queueing
+            await self._slot.acquire()
+        else:
+            if self._waiting >= self.max_queue_depth:
+                raise self._reject("Inference queue is full")
+            if self.estimated_wait() > self.queue_timeout:
+                raise self._reject("Inference queue wait exceeds deadline")
+
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._slot.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject("Timed out waiting for inference slot")
+            finally:
+                self._waiting -= 1
+
+        self.avg_wait_seconds = self._ewma(self.avg_wait_seconds, time.monotonic() - started)
+        self._running += 1
+        try:
+            yield
+        finally:
+            self._running -= 1
+            self._slot.release()
+
+    def _record_generation(self, seconds: float, tokens: int) -> None:
+        """Update generation time and rate measurements"""
+        self.completed += 1
+        self.avg_generation_seconds = self._ewma(self.avg_generation_seconds, seconds)
+        if seconds > 0 and tokens > 0:
+            self.tokens_per_second = self._ewma(self.tokens_per_second, tokens / seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, wait time and generation rate for monitoring"""
+        return {
+            "queue_depth": self._waiting,
+            "running": self._running,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_timeout_seconds": self.queue_timeout,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": round(self.avg_wait_seconds, 3),
+            "avg_generation_seconds": round(self.avg_generation_seconds, 3),
+            "tokens_per_second": round(self.tokens_per_second, 2),
+            "prefix_cache": self.prefix_cache.stats() if self.prefix_cache else None,
+            "batching": self.scheduler.stats() if self.scheduler else None,
+        }
+
+    async def fetch_stats(self) -> Dict[str, Any]:
+        """Monitoring stats (same interface as RemoteInferenceExecutor)"""
+        return self.stats()
+
+    async def _submit(self, fn, *args, **kwargs):
+        """Run a blocking callable on the inference thread and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def _load(self, model_path: str, **model_kwargs) -> None:
+        """Load the model (runs on the inference thread)"""
+        try:
+            # Import llama-cpp-python only when needed
+            from llama_cpp import Llama
+
+            if self.prefix_cache:
+                # Saved states belong to the previous model
+                self.prefix_cache.clear()
+            if Path(model_path).exists():
+                logger.info("Loading Phi-3-mini model...")
+                self.llm = Llama(model_path=model_path, **model_kwargs)
+                logger.info("Model loaded successfully")
+                if self.batch_size > 1:
+                    self._init_scheduler()
+            else:
+                logger.warning("Model file not found. Using mock responses.")
+                self.llm = None
+        except ImportError:
+            logger.warning("llama-cpp-python not installed. Using mock responses.")
+            self.llm = None
+        except Exception as e:
+            logger.error(f"Error loading model: {e}")
+            self.llm = None
+
+    def _init_scheduler(self) -> None:
+        """Set up continuous batching for the loaded model (runs on the inference thread)"""
+        try:
+            from batching import BatchScheduler
+            self.scheduler = BatchScheduler(self.llm, max_sequences=self.batch_size)
+            logger.info(f"Continuous batching enabled for {self.batch_size} sequences")
+        except Exception as e:
+            logger.warning(f"Continuous batching unavailable, generating one request at a time: {e}")
+            self.scheduler = None
+            self.batch_size = 1
+            self._slot = asyncio.Semaphore(1)
+
+    async def load(self, model_path: str, **model_kwargs) -> None:
+        """Load the model without blocking the event loop"""
+        await self._submit(self._load, model_path, **model_kwargs)
+
+    def _prepare_prefix(self, prefix: Optional[str]) -> None:
+        """Put the model in the state right after evaluating prefix (runs on the inference thread)
+
+        On a cache hit the saved state is restored; on a miss the prefix is
+        evaluated once and its state saved. llama-cpp then only evaluates the
+        prompt tokens after the longest matching prefix.
+        """
+        if not prefix or self.prefix_cache is None:
+            return
+        try:
+            state = self.prefix_cache.get(prefix)
+            if state is not None:
+                self.llm.load_state(state)
+                return
+            self.llm.reset()
+            self.llm.eval(self.llm.tokenize(prefix.encode("utf-8")))
+            self.prefix_cache.put(prefix, self.llm.save_state())
+        except Exception as e:
+            # Fall back to evaluating the whole prompt
+            logger.warning(f"Prefix state cache unavailable: {e}")
+            self.llm.reset()
+
+    def _schedule(self, prompt: str, params: Dict[str, Any]):
+        """Hand a request to the batch scheduler and return it with its token iterator"""
+        from batching import BatchRequest
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        request = BatchRequest(
+            prompt, params,
+            emit=lambda event, payload: loop.call_soon_threadsafe(queue.put_nowait, (event, payload))
+        )
+        if self.scheduler.submit(request):
+            self._executor.submit(self.scheduler.run)
+
+        async def tokens() -> AsyncIterator[str]:
+            finished = False
+            try:
+                while True:
+                    event, payload = await queue.get()
+                    if event == "token":
+                        yield payload
+                    elif event == "error":
+                        finished = True
+                        raise payload
+                    else:
+                        finished = True
+                        return
+            finally:
+                if not finished:
+                    # Client went away; the scheduler frees the sequence on its next step
+                    request.cancelled.set()
+
+        return request, tokens()
+
+    def _stream(self, prompt: str, prefix: Optional[str], params: Dict[str, Any],
+                loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, cancelled: threading.Event) -> None:
+        """Run a streaming completion and hand tokens to the event loop (runs on the inference thread)"""
+        try:
+            if self.llm is None:
+                raise RuntimeError("Model is not loaded")
+            self._prepare_prefix(prefix)
+            for chunk in self.llm(prompt, stream=True, **params):
+                if cancelled.is_set():
+                    # Client went away; stop decoding so the next request can start
+                    break
+                text = chunk['choices'][0]['text']
+                if text:
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+
+    async def stream(self, prompt: str, prefix: Optional[str] = None, **params) -> AsyncIterator[str]:
+        """
+        Stream completion tokens from the inference thread
+
+        Args:
+            prompt: Full prompt text
+            prefix: Leading part of the prompt shared across requests, reused from the prefix cache
+                (not used when continuous batching is enabled)
+            **params: Sampling parameters passed to the model
+
+        Yields:
+            Text fragments as the model produces them
+
+        Raises:
+            InferenceOverloaded: If the request is shed by admission control
+        """
+        async with self.admission():
+            if self.scheduler:
+                started = time.monotonic()
+                request, tokens = self._schedule(prompt, params)
+                try:
+                    async for token in tokens:
+                        yield token
+                finally:
+                    await tokens.aclose()
+                self._record_generation(time.monotonic() - started, request.n_generated)
+                return
+
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+            cancelled = threading.Event()
+            done = loop.run_in_executor(self._executor, self._stream, prompt, prefix, params, loop, queue, cancelled)
+            started = time.monotonic()
+            tokens = 0
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is _STREAM_END:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    tokens += 1
+                    yield item
+                self._record_generation(time.monotonic() - started, tokens)
+            finally:
+                cancelled.set()
+                # Hold the slot until the inference thread has actually stopped
+                await asyncio.shield(done)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the inference thread"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+class RemoteInferenceExecutor:
+    """Client for a shared inference server listening on a Unix socket
+
+    Mirrors the InferenceExecutor interface so API workers can use either one.
+    Messages are newline-delimited JSON; see inference_server.py for the protocol.
+    """
+
+    def __init__(self, socket_path: str, poll_interval: float = 5.0, request_timeout: float = 600.0):
+        self.socket_path = socket_path
+        self.poll_interval = poll_interval
+        self.request_timeout = request_timeout
+        self._model_loaded = False
+        self._last_stats: Dict[str, Any] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @property
+    def model_loaded(self) -> bool:
+        """Whether the inference server last reported a loaded model"""
+        return self._model_loaded
+
+    @property
+    def model_loading(self) -> bool:
+        """Whether the inference server last reported a model download or load in progress"""
+        return bool(self._last_stats.get("model_loading"))
+
+    async def _open(self, payload: Dict[str, Any]):
+        """Connect to the inference server and send one request"""
+        reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=16 * 1024 * 1024)
+        writer.write(json.dumps(payload).encode() + b"\n")
+        await writer.drain()
+        return reader, writer
+
+    @staticmethod
+    async def _read_message(reader: asyncio.StreamReader, timeout: float) -> Dict[str, Any]:
+        line = await asyncio.wait_for(reader.readline(), timeout=timeout)
+        if not line:
+            raise RuntimeError("Inference server closed the connection")
+        message = json.loads(line)
+        if message.get("type") == "error":
+            if message.get("kind") == "overloaded":
+                raise InferenceOverloaded(message["retry_after"], message.get("reason", "Inference queue is full"))
+            raise RuntimeError(message.get("message", "Inference server error"))
+        return message
+
+    async def _call(self, payload: Dict[str, Any], timeout: float) -> Any:
+        reader, writer = await self._open(payload)
+        try:
+            return (await self._read_message(reader, timeout))["data"]
+        finally:
+            writer.close()
+
+    async def fetch_stats(self) -> Dict[str, Any]:
+        """Fetch stats from the inference server and refresh model_loaded"""
+        try:
+            self._last_stats = await self._call({"op": "stats"}, timeout=5.0)
+            self._model_loaded = bool(self._last_stats.get("model_loaded"))
+        except (OSError, RuntimeError, asyncio.TimeoutError) as e:
+            logger.warning(f"Inference server unavailable at {self.socket_path}: {e}")
+            self._model_loaded = False
+            self._last_stats = {"error": "Inference server unavailable"}
+        return self._last_stats
+
+    def stats(self) -> Dict[str, Any]:
+        """Most recently fetched server stats"""
+        return self._last_stats
+
+    async def _watch(self) -> None:
+        """Keep model_loaded in sync with the inference server"""
+        while True:
+            await self.fetch_stats()
+            await asyncio.sleep(self.poll_interval)
+
+    async def load(self, model_path: str = None, **model_kwargs) -> None:
+        """Connect to the inference server; the model itself is loaded there"""
+        await self.fetch_stats()
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def stream(self, prompt: str, prefix: Optional[str] = None, **params) -> AsyncIterator[str]:
+        """Stream completion tokens from the inference server"""
+        reader, writer = await self._open({"op": "stream", "prompt": prompt, "prefix": prefix, "params": params})
+        try:
+            while True:
+                message = await self._read_message(reader, self.request_timeout)
+                if message["type"] == "end":
+                    break
+                yield message["text"]
+        finally:
+            # Closing the connection tells the server to stop decoding
+            writer.close()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop polling the inference server"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
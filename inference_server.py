@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Shared inference server for the Coding AI Assistant
+One process owns the model; API workers talk to it over a Unix socket
+
+Protocol: the client sends one JSON line per connection,
+    {"op": "stats"}
+    {"op": "stream", "prompt": ..., "prefix": ..., "params": {...}}
+and the server answers with JSON lines:
+    {"type": "result", "data": ...}
+    {"type": "token", "text": ...} ... {"type": "end"}
+    {"type": "error", "kind": "overloaded" | "internal", ...}
+"""
+
+import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import threading
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from inference import InferenceExecutor, InferenceOverloaded, DEFAULT_MODEL_KWARGS
+from downloader import download_file
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger("inference_server")
+
+MODEL_PATH = os.getenv("MODEL_PATH", "/opt/render/project/src/models/phi-2.Q4_K_M.gguf")
+MODEL_URL = os.getenv("MODEL_URL", "https://huggingface.co/TheBloke/phi-2-GGUF/resolve/main/phi-2.Q4_K_M.gguf")
+MODEL_SHA256 = os.getenv("MODEL_SHA256")  # Optional checksum verified after download
+MODEL_DOWNLOAD_CONNECTIONS = int(os.getenv("MODEL_DOWNLOAD_CONNECTIONS", "1"))
+HF_TOKEN = os.getenv("HF_TOKEN")
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "/tmp/inference.sock")
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", str(DEFAULT_MODEL_KWARGS["n_threads"])))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "8"))
+INFERENCE_QUEUE_TIMEOUT = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "30"))
+PROMPT_CACHE_MB = int(os.getenv("PROMPT_CACHE_MB", "128"))
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "1"))
+
+
+class InferenceServer:
+    """Serves an InferenceExecutor to API workers over a Unix socket"""
+
+    def __init__(self, executor: InferenceExecutor, socket_path: str):
+        self.executor = executor
+        self.socket_path = socket_path
+        self._server = None
+        self.loading_task: Optional[asyncio.Task] = None  # Background model download and load
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, message: dict) -> None:
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Handle one request connection"""
+        try:
+            request = json.loads(await reader.readline())
+            op = request.get("op")
+
+            if op == "stats":
+                stats = self.executor.stats()
+                stats["model_loaded"] = self.executor.model_loaded
+                stats["model_loading"] = self.loading_task is not None and not self.loading_task.done()
+                await self._send(writer, {"type": "result", "data": stats})
+
+            elif op == "stream":
+                tokens = self.executor.stream(
+                    request["prompt"], prefix=request.get("prefix"), **request.get("params", {})
+                )
+                try:
+                    async for token in tokens:
+                        await self._send(writer, {"type": "token", "text": token})
+                    await self._send(writer, {"type": "end"})
+                finally:
+                    # Stops decoding if the API worker disconnected mid-stream
+                    await tokens.aclose()
+
+            else:
+                await self._send(writer, {"type": "error", "kind": "internal", "message": f"Unknown op: {op}"})
+
+        except InferenceOverloaded as e:
+            await self._send(writer, {
+                "type": "error", "kind": "overloaded", "retry_after": e.retry_after, "reason": e.reason
+            })
+        except (ConnectionError, asyncio.IncompleteReadError):
+            logger.info("Client disconnected")
+        except Exception as e:
+            logger.error(f"Error handling inference request: {e}")
+            try:
+                await self._send(writer, {"type": "error", "kind": "internal", "message": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        """Start listening on the Unix socket"""
+        socket_file = Path(self.socket_path)
+        if socket_file.exists():
+            socket_file.unlink()
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"Inference server listening on {self.socket_path}")
+
+    async def serve_forever(self) -> None:
+        async with self._server:
+            await self._server.serve_forever()
+
+
+async def load_model(executor: InferenceExecutor, stop: threading.Event) -> None:
+    """Download the model if it is missing, then load it; runs in the background"""
+    if not Path(MODEL_PATH).exists():
+        logger.info("Model not found, downloading")
+        try:
+            headers = {"Authorization": f"Bearer {HF_TOKEN}"} if HF_TOKEN else None
+            await asyncio.to_thread(
+                download_file,
+                MODEL_URL,
+                Path(MODEL_PATH),
+                expected_sha256=MODEL_SHA256,
+                headers=headers,
+                connections=MODEL_DOWNLOAD_CONNECTIONS,
+                stop=stop
+            )
+            logger.info("Model downloaded successfully")
+        except Exception as e:
+            logger.error(f"Error downloading model: {e}; workers will serve mock responses")
+            return
+    await executor.load(MODEL_PATH, **dict(DEFAULT_MODEL_KWARGS, n_threads=INFERENCE_THREADS))
+
+
+async def run(socket_path: str) -> None:
+    executor = InferenceExecutor(
+        max_queue_depth=INFERENCE_MAX_QUEUE,
+        queue_timeout=INFERENCE_QUEUE_TIMEOUT,
+        prefix_cache_bytes=PROMPT_CACHE_MB * 1024 * 1024,
+        batch_size=INFERENCE_BATCH_SIZE
+    )
+    server = InferenceServer(executor, socket_path)
+    # Accept connections right away; workers see model_loaded=false until the download and load finish
+    await server.start()
+    stop = threading.Event()
+    server.loading_task = asyncio.create_task(load_model(executor, stop))
+    try:
+        await server.serve_forever()
+    finally:
+        # Cancelling the task does not stop the download thread; the event does
+        stop.set()
+        server.loading_task.cancel()
+        executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared inference server")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET, help="Unix socket path")
+    args = parser.parse_args()
+    asyncio.run(run(args.socket))
+
+
+if __name__ == "__main__":
+    main()
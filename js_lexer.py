@@ -0,0 +1,259 @@
+"""
+JavaScript/TypeScript lexer for the Coding AI Assistant
+Splits code into tokens in one linear pass, tracking string, comment, regex,
+template-literal and JSX state so later checks never look inside them
+"""
+
+import re
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"""
+    (?P<newline>\r\n|[\n\r\u2028\u2029])
+  | (?P<space>[ \t\f\v\ufeff\xa0]+)
+  | (?P<line_comment>//[^\r\n\u2028\u2029]*)
+  | (?P<block_comment>/\*[\s\S]*?\*/)
+  | (?P<string>"(?:[^"\\\r\n]|\\[\s\S])*"|'(?:[^'\\\r\n]|\\[\s\S])*')
+  | (?P<number>(?:0[xX][\da-fA-F_]+|0[oO][0-7_]+|0[bB][01_]+|(?:\d[\d_]*\.?[\d_]*|\.\d[\d_]*)(?:[eE][+-]?\d+)?)n?)
+  | (?P<name>(?:[^\W\d]|\$)[\w$]*)
+  | (?P<punct>>>>=|\.\.\.|===|!==|\*\*=|<<=|>>=|>>>|&&=|\|\|=|\?\?=|=>|==|!=|<=|>=|&&|\|\||\?\?|\?\.
+             |\+\+|--|[+\-*/%&|^]=|<<|>>|\*\*|[{}()\[\];,<>+\-*/%&|^!~?:=.@\#])
+""", re.VERBOSE)
+
+_REGEX_RE = re.compile(r"/(?:[^/\\\[\r\n]|\\.|\[(?:[^\]\\\r\n]|\\.)*\])+/[A-Za-z]*")
+
+# Template text up to the closing backtick or the next ${
+_TEMPLATE_RE = re.compile(r"(?:[^`\\$]|\\[\s\S]|\$(?!\{))*")
+
+# JSX element text runs up to the next tag or {expression}
+_JSX_TEXT_RE = re.compile(r"[^<{]*")
+
+# Inside a tag: attribute strings (no escapes, may span lines), names and single characters
+_JSX_TAG_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>"[^"]*"|'[^']*')
+  | (?P<name>[\w$.:\-]+)
+  | (?P<other>[^\s"'{>/]|/(?!>))
+""", re.VERBOSE)
+
+# `<` in expression position opens an element, unless it is a TypeScript generic like <T,> or <T extends U>
+_JSX_START_RE = re.compile(r"<(?:>|[A-Za-z_$][\w$.:\-]*(?![\w$.:\-])(?!\s*,|\s+extends\b))")
+
+# After these keywords a `/` starts a regex literal rather than a division
+_REGEX_KEYWORDS = frozenset({
+    "return", "typeof", "instanceof", "in", "of", "new", "delete", "void",
+    "throw", "case", "do", "else", "yield", "await"
+})
+
+# Reserved words that cannot end an expression
+KEYWORDS = frozenset({
+    "break", "case", "catch", "class", "const", "continue", "debugger", "default",
+    "delete", "do", "else", "export", "extends", "finally", "for", "function", "if",
+    "import", "in", "instanceof", "let", "new", "return", "switch", "throw", "try",
+    "typeof", "var", "void", "while", "with", "yield", "await", "of"
+})
+
+
+class Token(NamedTuple):
+    kind: str  # name, number, string, template, regex, punct, comment, jsx
+    value: str
+    pos: int
+    line: int
+    newline_before: bool  # A line terminator separates this token from the previous one
+
+
+def _regex_allowed(previous: Optional[Token]) -> bool:
+    if previous is None:
+        return True
+    if previous.kind == "punct":
+        return previous.value not in (")", "]", "}")
+    if previous.kind == "name":
+        return previous.value in _REGEX_KEYWORDS
+    return False
+
+
+def tokenize(code: str) -> Tuple[List[Token], List[Dict[str, Any]]]:
+    """
+    Tokenize JavaScript/TypeScript code
+
+    Args:
+        code: Source text
+
+    Returns:
+        (tokens, errors); whitespace is dropped, comments are kept as
+        "comment" tokens, JSX tags and text become "jsx" tokens (their
+        {expressions} are lexed as ordinary code), and errors describe
+        unterminated literals or unknown characters
+    """
+    tokens: List[Token] = []
+    errors: List[Dict[str, Any]] = []
+    pos = 0
+    line = 1
+    newline_before = False
+    previous: Optional[Token] = None  # Last non-comment token
+    brace_depth = 0
+    template_depths: List[int] = []  # brace depth at which each open ${ resumes its template
+    # Open JSX element trees, innermost last: {"brace": depth at which it resumes, "tag": inside a tag,
+    # "closing": that tag is a closing tag, "open": elements not yet closed}
+    jsx: List[Dict[str, Any]] = []
+
+    def emit(kind: str, value: str, start: int, start_line: int) -> None:
+        nonlocal newline_before, previous
+        token = Token(kind, value, start, start_line, newline_before)
+        tokens.append(token)
+        newline_before = False
+        if kind != "comment":
+            previous = token
+
+    def scan_template(start: int, start_line: int) -> int:
+        """Consume template text after the ` or } at `start`; returns the position after it
+
+        Template tokens keep that leading character, so a value starting with
+        a backtick opens a literal and one ending with a backtick closes it.
+        """
+        nonlocal line
+        match = _TEMPLATE_RE.match(code, start + 1)
+        end = match.end()
+        line += code.count("\n", start, end)
+        if end >= len(code):
+            errors.append({"line": start_line, "position": start,
+                           "message": "Unterminated template literal", "type": "LexError"})
+            return end
+        if code[end] == "`":
+            emit("template", code[start:end + 1], start, start_line)
+            return end + 1
+        # ${ opens a substitution lexed as ordinary code
+        emit("template", code[start:end + 2], start, start_line)
+        template_depths.append(brace_depth)
+        return end + 2
+
+    def scan_jsx(start: int) -> int:
+        """Consume JSX at `start` up to the next {expression} or the end of the element tree"""
+        nonlocal line, newline_before
+        element = jsx[-1]
+        pos = start
+        while pos < length:
+            if not element["tag"]:
+                match = _JSX_TEXT_RE.match(code, pos)
+                if match.end() > pos:
+                    emit("jsx", match.group(), pos, line)
+                    newlines = match.group().count("\n")
+                    if newlines:
+                        line += newlines
+                        newline_before = True
+                pos = match.end()
+                if pos >= length:
+                    break
+                if code[pos] == "{":
+                    return pos  # Lexed as ordinary code until the matching }
+                closing = code.startswith("</", pos)
+                emit("jsx", code[pos:pos + 1 + closing], pos, line)
+                pos += 1 + closing
+                element.update(tag=True, closing=closing)
+                if not closing:
+                    element["open"] += 1
+                continue
+
+            if code[pos] == "{":
+                return pos
+            if code[pos] == ">" or code.startswith("/>", pos):
+                end = pos + (1 if code[pos] == ">" else 2)
+                emit("jsx", code[pos:end], pos, line)
+                if element["closing"] or end - pos == 2:
+                    element["open"] -= 1
+                element.update(tag=False, closing=False)
+                pos = end
+                if element["open"] == 0:
+                    jsx.pop()
+                    return pos
+                continue
+            match = _JSX_TAG_RE.match(code, pos)
+            if match is None:
+                errors.append({"line": line, "position": pos,
+                               "message": "Unterminated JSX attribute string", "type": "LexError"})
+                jsx.pop()
+                return length
+            if match.lastgroup != "space":
+                emit("jsx", match.group(), pos, line)
+            newlines = match.group().count("\n")
+            if newlines:
+                line += newlines
+                newline_before = True
+            pos = match.end()
+
+        errors.append({"line": line, "position": start,
+                       "message": "Unterminated JSX element", "type": "LexError"})
+        jsx.pop()
+        return length
+
+    length = len(code)
+    while pos < length:
+        char = code[pos]
+
+        if jsx and brace_depth == jsx[-1]["brace"] and char != "{":
+            pos = scan_jsx(pos)
+            continue
+        if char == "<" and _regex_allowed(previous) and _JSX_START_RE.match(code, pos):
+            jsx.append({"brace": brace_depth, "tag": True, "closing": False, "open": 1})
+            emit("jsx", "<", pos, line)
+            pos = scan_jsx(pos + 1)
+            continue
+
+        if char == "`":
+            pos = scan_template(pos, line)
+            continue
+        if char == "}" and template_depths and brace_depth == template_depths[-1]:
+            template_depths.pop()
+            pos = scan_template(pos, line)
+            continue
+        if char == "/" and code[pos + 1:pos + 2] not in ("/", "*") and _regex_allowed(previous):
+            match = _REGEX_RE.match(code, pos)
+            if match:
+                emit("regex", match.group(), pos, line)
+                pos = match.end()
+                continue
+
+        if code.startswith("/*", pos) and code.find("*/", pos + 2) < 0:
+            errors.append({"line": line, "position": pos,
+                           "message": "Unterminated block comment", "type": "LexError"})
+            break
+
+        match = _TOKEN_RE.match(code, pos)
+        if match is None:
+            if char in "\"'":
+                errors.append({"line": line, "position": pos,
+                               "message": "Unterminated string literal", "type": "LexError"})
+            else:
+                errors.append({"line": line, "position": pos,
+                               "message": f"Unexpected character '{char}'", "type": "LexError"})
+            # Resume at the next line so one bad literal does not cascade
+            newline = code.find("\n", pos)
+            pos = length if newline < 0 else newline
+            continue
+
+        kind = match.lastgroup
+        value = match.group()
+        start_line = line
+        if kind == "newline":
+            line += 1
+            newline_before = True
+        elif kind == "space":
+            pass
+        elif kind in ("line_comment", "block_comment"):
+            emit("comment", value, pos, start_line)
+            newlines = value.count("\n")
+            if newlines:
+                line += newlines
+                newline_before = True
+        else:
+            if kind == "punct":
+                if value == "{":
+                    brace_depth += 1
+                elif value == "}":
+                    brace_depth -= 1
+            elif kind == "string":
+                # Line continuations inside strings
+                line += value.count("\n")
+            emit(kind, value, pos, start_line)
+        pos = match.end()
+
+    return tokens, errors
@@ -0,0 +1,74 @@
+"""
+Shared keyword matching for the Coding AI Assistant
+One compiled keyword table serves topic, language/framework/concept, follow-up
+and mock-response detection, so each text is lowercased and scanned once
+"""
+
+from typing import Dict, List, Set
+
+from cache import LRUCache
+
+# category -> label -> substrings that mark the label (matched on lowercased text)
+KEYWORD_TABLE: Dict[str, Dict[str, List[str]]] = {
+    # Per-user topic aggregates (/suggest, chat context)
+    "topic": {
+        "python": ["python"],
+        "javascript": ["javascript", "js"],
+        "react": ["react"],
+        "api": ["api"],
+        "database": ["database", "mongodb"],
+    },
+    # ConversationManager.extract_code_context
+    "language": {name: [name] for name in ["python", "javascript", "typescript", "java", "c++", "rust", "go"]},
+    "framework": {name: [name] for name in ["react", "vue", "angular", "django", "flask", "fastapi", "express", "nextjs"]},
+    "concept": {name: [name] for name in ["api", "database", "authentication", "deployment", "testing", "docker", "ci/cd"]},
+    # Follow-up questions in build_chat_response
+    "follow_up": {
+        "app_type": ["web", "app"],
+        "database": ["database"],
+        "api": ["api"],
+    },
+    # Canned replies in generate_mock_response
+    "mock": {name: [name] for name in ["hello", "python", "javascript", "help"]},
+}
+
+
+class KeywordMatcher:
+    """Matches every keyword of a category table against a text in one pass over the keyword set
+
+    Keywords shared between categories are looked up once, and results for
+    recently scanned texts are memoized so the several call sites handling
+    the same message share a single scan.
+    """
+
+    def __init__(self, table: Dict[str, Dict[str, List[str]]], memo_size: int = 64):
+        self.categories = list(table)
+        # keyword -> [(category, label), ...]
+        self._keywords: Dict[str, List[tuple]] = {}
+        for category, labels in table.items():
+            for label, keywords in labels.items():
+                for keyword in keywords:
+                    self._keywords.setdefault(keyword.lower(), []).append((category, label))
+        self._memo = LRUCache(max_entries=memo_size)
+
+    def scan(self, text: str) -> Dict[str, Set[str]]:
+        """Labels found in text, by category (every category is present, possibly empty)"""
+        hits = self._memo.get(text)
+        if hits is None:
+            lowered = text.lower()
+            hits = {category: set() for category in self.categories}
+            for keyword, targets in self._keywords.items():
+                if keyword in lowered:
+                    for category, label in targets:
+                        hits[category].add(label)
+            self._memo.set(text, hits)
+        # Callers may mutate their copy
+        return {category: set(labels) for category, labels in hits.items()}
+
+
+KEYWORDS = KeywordMatcher(KEYWORD_TABLE)
+
+
+def scan_keywords(text: str) -> Dict[str, Set[str]]:
+    """Scan text with the shared keyword table"""
+    return KEYWORDS.scan(text)
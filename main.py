@@ -8,21 +8,23 @@ import sys
 import json
 import logging
 import hashlib
-import ast
+import uuid
 import re
+import zlib
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple, Set
 from contextlib import asynccontextmanager
 import asyncio
+import threading
+import time
 import subprocess
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException, Depends, status, Request
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel, Field, validator
-from pymongo import MongoClient, ASCENDING, errors
-from pymongo.database import Database
+from pymongo import errors
 from dotenv import load_dotenv
 import uvicorn
 from jose import JWTError, jwt
@@ -30,7 +32,18 @@ from passlib.context import CryptContext
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-import httpx
+
+from inference import InferenceExecutor, RemoteInferenceExecutor, InferenceOverloaded, DEFAULT_MODEL_KWARGS
+from cache import LRUCache, make_cache_key
+from downloader import download_file
+from repository import MongoRepository, encode_cursor
+from write_behind import WriteBehindBuffer
+from topics import preferences_from_topics
+from keywords import scan_keywords
+from analysis import summarize_issues, analysis_cache, rule_stats, configure_cache
+from analysis_pool import AnalysisPool, StreamingAnalysis, skipped_result
+from code_blocks import extract_code_blocks
+from postprocess import PostProcessingPipeline
 
 # Load environment variables
 load_dotenv()
@@ -50,9 +63,54 @@ logger = logging.getLogger(__name__)
 PORT = int(os.getenv("PORT"))  # Port is required in production
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 MODEL_PATH = os.getenv("MODEL_PATH", "/opt/render/project/src/models/phi-2.Q4_K_M.gguf")
+# Using the smaller TheBloke phi-2 quantized GGUF model (Q4_K_M)
+MODEL_URL = os.getenv("MODEL_URL", "https://huggingface.co/TheBloke/phi-2-GGUF/resolve/main/phi-2.Q4_K_M.gguf")
+MODEL_SHA256 = os.getenv("MODEL_SHA256")  # Optional checksum verified after download
+MODEL_DOWNLOAD_CONNECTIONS = int(os.getenv("MODEL_DOWNLOAD_CONNECTIONS", "1"))
+HF_TOKEN = os.getenv("HF_TOKEN")
+# Seconds a chat request may wait for a model that is still loading (0 = serve mock immediately)
+CHAT_WAIT_FOR_MODEL = float(os.getenv("CHAT_WAIT_FOR_MODEL", "0"))
+# How often a waiting chat request checks whether the model has loaded
+MODEL_WAIT_POLL_SECONDS = 0.5
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "8"))
+INFERENCE_QUEUE_TIMEOUT = float(os.getenv("INFERENCE_QUEUE_TIMEOUT", "30"))
+PROMPT_CACHE_MB = int(os.getenv("PROMPT_CACHE_MB", "128"))
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "1"))
+# When set, the model lives in a shared inference_server.py process on this socket
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Maximum messages stored per conversation bucket document
+CONVERSATION_BUCKET_SIZE = int(os.getenv("CONVERSATION_BUCKET_SIZE", "100"))
+# Messages of recent history loaded into the chat context
+CHAT_HISTORY_MESSAGES = 10
+# Largest page /history will return
+HISTORY_PAGE_MAX = 200
+# Documents fetched per MongoDB round trip by /history/{user_id}/export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Chat exchanges are written behind the response in batches of up to this size
+CONVERSATION_FLUSH_BATCH = int(os.getenv("CONVERSATION_FLUSH_BATCH", "100"))
+CONVERSATION_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "0.5"))
+CONVERSATION_MAX_PENDING = int(os.getenv("CONVERSATION_MAX_PENDING", "10000"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "1024"))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))
+# Code blocks are analyzed in worker processes within these budgets
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+ANALYSIS_TIMEOUT = float(os.getenv("ANALYSIS_TIMEOUT", "2"))
+ANALYSIS_MAX_BYTES = int(os.getenv("ANALYSIS_MAX_BYTES", "200000"))
+ANALYSIS_CACHE_MB = int(os.getenv("ANALYSIS_CACHE_MB", "32"))
+ANALYZE_BATCH_MAX = int(os.getenv("ANALYZE_BATCH_MAX", "500"))
+
+# Sampling parameters shared by /chat and /chat/stream
+GENERATION_PARAMS = {
+    "max_tokens": 512,
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "stop": ["User:", "\n\n"]
+}
 
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
@@ -61,12 +119,39 @@ limiter = Limiter(key_func=get_remote_address)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Global variables for model
-llm = None
+if INFERENCE_SOCKET:
+    inference = RemoteInferenceExecutor(INFERENCE_SOCKET)
+else:
+    inference = InferenceExecutor(
+        max_queue_depth=INFERENCE_MAX_QUEUE,
+        queue_timeout=INFERENCE_QUEUE_TIMEOUT,
+        prefix_cache_bytes=PROMPT_CACHE_MB * 1024 * 1024,
+        batch_size=INFERENCE_BATCH_SIZE
+    )
 model_loading_task = None
+# Set on shutdown so a download running in a worker thread stops between chunks
+model_download_stop = threading.Event()
+
+# Exact-match cache of model-generated chat responses
+response_cache = LRUCache(max_entries=RESPONSE_CACHE_SIZE, ttl_seconds=RESPONSE_CACHE_TTL)
+
+# User profiles by user_id, invalidated by the repository on profile writes
+profile_cache = LRUCache(max_entries=PROFILE_CACHE_SIZE, ttl_seconds=PROFILE_CACHE_TTL)
+
+# Analysis results memoized by content hash, sized from the environment loaded above
+configure_cache(ANALYSIS_CACHE_MB)
+
+# Worker processes for code analysis (started on first use)
+analysis_pool = AnalysisPool(
+    max_workers=ANALYSIS_WORKERS,
+    timeout=ANALYSIS_TIMEOUT,
+    max_code_bytes=ANALYSIS_MAX_BYTES
+)
 
 # MongoDB connection
-mongo_client = None
-db: Optional[Database] = None
+repo: Optional[MongoRepository] = None
+# Batches chat exchanges into bulk writes off the request path
+conversation_writer: Optional[WriteBehindBuffer] = None
 
 # Pydantic models
 class ChatMessage(BaseModel):
@@ -74,6 +159,9 @@ class ChatMessage(BaseModel):
     context: Optional[Dict[str, Any]] = None
     skill_level: Optional[str] = Field(default="intermediate", pattern="^(beginner|intermediate|advanced)$")
     preferences: Optional[Dict[str, List[str]]] = None
+    use_cache: bool = True  # Set to false to bypass the response cache
+    post_processing: Optional[Dict[str, bool]] = None  # e.g. {"analysis": false} to skip code analysis
+    session_id: Optional[str] = None  # Continue an existing session; a new one is started if omitted
 
 class ChatResponse(BaseModel):
     response: str
@@ -82,6 +170,15 @@ class ChatResponse(BaseModel):
     follow_up_questions: Optional[List[str]] = None
     error_detected: bool = False
     error_details: Optional[List[str]] = None
+    session_id: Optional[str] = None
+
+class CodeSnippet(BaseModel):
+    language: str
+    code: str
+    id: Optional[str] = None  # Echoed back, e.g. a file path
+
+class AnalyzeBatchRequest(BaseModel):
+    snippets: List[CodeSnippet]
 
 class UserProfile(BaseModel):
     user_id: str
@@ -105,96 +202,124 @@ class UserAuth(BaseModel):
 
 async def download_model():
     """Download the Phi-3-mini model if not present"""
-    model_dir = Path("./models")
-    model_dir.mkdir(exist_ok=True)
-    
     if not Path(MODEL_PATH).exists():
         logger.info("Model not found. Downloading Phi-3-mini model...")
         try:
-            # Using the smaller TheBloke phi-2 quantized GGUF model (Q4_K_M)
-            model_url = "https://huggingface.co/TheBloke/phi-2-GGUF/resolve/main/phi-2.Q4_K_M.gguf"
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.get(model_url, follow_redirects=True, timeout=300.0)
-                if response.status_code == 200:
-                    with open(MODEL_PATH, "wb") as f:
-                        f.write(response.content)
-                    logger.info("Model downloaded successfully")
-                else:
-                    logger.error(f"Failed to download model: {response.status_code}")
-                    logger.info("Using fallback model configuration")
+            headers = {"Authorization": f"Bearer {HF_TOKEN}"} if HF_TOKEN else None
+            # Runs in a worker thread; streams to disk and resumes a previous .part file
+            await asyncio.to_thread(
+                download_file,
+                MODEL_URL,
+                Path(MODEL_PATH),
+                expected_sha256=MODEL_SHA256,
+                headers=headers,
+                connections=MODEL_DOWNLOAD_CONNECTIONS,
+                stop=model_download_stop
+            )
+            logger.info("Model downloaded successfully")
         except Exception as e:
             logger.error(f"Error downloading model: {e}")
             logger.info("Continuing without model download - will use mock responses")
 
 async def initialize_llm():
-    """Initialize the language model"""
-    global llm
-    try:
-        # Import llama-cpp-python only when needed
-        from llama_cpp import Llama
-        
-        if Path(MODEL_PATH).exists():
-            logger.info("Loading Phi-3-mini model...")
-            llm = Llama(
-                model_path=MODEL_PATH,
-                n_ctx=4096,  # Context window
-                n_threads=2,  # Use 2 threads for low memory usage
-                n_gpu_layers=0,  # CPU only for Render free tier
-                verbose=False
-            )
-            logger.info("Model loaded successfully")
-        else:
-            logger.warning("Model file not found. Using mock responses.")
-            llm = None
-    except ImportError:
-        logger.warning("llama-cpp-python not installed. Using mock responses.")
-        llm = None
-    except Exception as e:
-        logger.error(f"Error loading model: {e}")
-        llm = None
+    """Initialize the language model on the inference thread, or connect to the inference server"""
+    await inference.load(MODEL_PATH, **DEFAULT_MODEL_KWARGS)
 
-def initialize_mongodb():
+async def initialize_mongodb():
     """Initialize MongoDB connection with proper error handling"""
-    global mongo_client, db
+    global repo
     try:
-        mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+        repo = MongoRepository(MONGO_URI, timeout_ms=5000, bucket_size=CONVERSATION_BUCKET_SIZE,
+                               profile_cache=profile_cache)
         # Test connection
-        mongo_client.admin.command('ping')
-        db = mongo_client.coding_assistant
+        await repo.ping()
         
         # Create indexes
-        db.users.create_index([("user_id", ASCENDING)], unique=True)
-        db.conversations.create_index([("user_id", ASCENDING), ("session_id", ASCENDING)])
-        db.conversations.create_index([("created_at", ASCENDING)])
+        await repo.ensure_indexes()
+        
+        global conversation_writer
+        conversation_writer = WriteBehindBuffer(
+            flush_exchanges,
+            max_batch=CONVERSATION_FLUSH_BATCH,
+            flush_interval=CONVERSATION_FLUSH_INTERVAL,
+            max_pending=CONVERSATION_MAX_PENDING
+        )
+        conversation_writer.start()
         
         logger.info("MongoDB connected successfully")
     except errors.ServerSelectionTimeoutError:
         logger.error("MongoDB connection timeout. Using in-memory storage.")
-        db = None
+        repo = None
     except Exception as e:
         logger.error(f"MongoDB connection error: {e}")
-        db = None
+        repo = None
+
+async def flush_exchanges(entries: List[Tuple[str, str, List[Dict[str, Any]]]]):
+    """Write a batch of buffered chat exchanges and count their topics
+    
+    Only the conversation append is retried by the write-behind buffer (it is
+    idempotent). Topic counts are approximate: a failed increment is logged
+    rather than raised, so a retry never re-appends or double-counts.
+    """
+    await repo.conversations.append_many(entries)
+    try:
+        await repo.topics.increment_many([(user_id, messages) for user_id, _, messages in entries])
+    except Exception as e:
+        logger.warning(f"Topic counts for {len(entries)} exchanges not updated: {e}")
+
+async def load_model():
+    """Download (if needed) and load the model; runs as a background task"""
+    if not INFERENCE_SOCKET:
+        # The inference server process owns the model in shared mode
+        await download_model()
+    await initialize_llm()
+
+def model_loading() -> bool:
+    """Whether the model is still being downloaded or loaded, here or in the inference server"""
+    if model_loading_task is not None and not model_loading_task.done():
+        return True
+    return bool(INFERENCE_SOCKET) and inference.model_loading
+
+async def wait_for_model():
+    """Give a loading model up to CHAT_WAIT_FOR_MODEL seconds before falling back to mock responses"""
+    if CHAT_WAIT_FOR_MODEL <= 0:
+        return
+    deadline = time.monotonic() + CHAT_WAIT_FOR_MODEL
+    while not inference.model_loaded and model_loading():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.info("Model still loading, serving mock response")
+            return
+        await asyncio.sleep(min(MODEL_WAIT_POLL_SECONDS, remaining))
+        # Refreshes model_loaded/model_loading from the inference server in shared mode
+        await inference.fetch_stats()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown"""
     # Startup
     logger.info("Starting up...")
-    initialize_mongodb()
+    await initialize_mongodb()
     
-    # Start model download and loading in background
+    # Download and load the model in the background so the app serves right away
     global model_loading_task
-    model_loading_task = asyncio.create_task(download_model())
-    await model_loading_task
-    await initialize_llm()
+    model_loading_task = asyncio.create_task(load_model())
+    analysis_pool.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
-    if mongo_client:
-        mongo_client.close()
+    if model_loading_task is not None and not model_loading_task.done():
+        # Cancelling the task does not stop the download thread; the event does
+        model_download_stop.set()
+        model_loading_task.cancel()
+    inference.shutdown(wait=False)
+    analysis_pool.shutdown()
+    if conversation_writer is not None:
+        await conversation_writer.close()
+    if repo is not None:
+        repo.close()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -217,76 +342,14 @@ app.add_middleware(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
-def check_python_syntax(code: str) -> List[str]:
-    """Check Python code for syntax errors"""
-    errors_found = []
-    try:
-        ast.parse(code)
-    except SyntaxError as e:
-        errors_found.append(f"Syntax error at line {e.lineno}: {e.msg}")
-    except Exception as e:
-        errors_found.append(f"Parse error: {str(e)}")
-    
-    # Check for missing imports
-    import_pattern = r'\b(import|from)\s+(\w+)'
-    imports = re.findall(import_pattern, code)
-    common_modules = {'os', 'sys', 'json', 'datetime', 'typing', 'math', 'random', 're'}
-    
-    # Check if undefined names are used
-    try:
-        tree = ast.parse(code)
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
-                name = node.id
-                if name not in dir(__builtins__) and not any(name in imp for imp in imports):
-                    if name in common_modules:
-                        errors_found.append(f"Missing import: {name}")
-    except:
-        pass
-    
-    return errors_found
-
-def check_javascript_syntax(code: str) -> List[str]:
-    """Basic JavaScript syntax checking"""
-    errors_found = []
-    
-    # Check for common JS errors
-    if code.count('{') != code.count('}'):
-        errors_found.append("Mismatched curly braces")
-    if code.count('(') != code.count(')'):
-        errors_found.append("Mismatched parentheses")
-    if code.count('[') != code.count(']'):
-        errors_found.append("Mismatched square brackets")
-    
-    # Check for missing semicolons (basic check)
-    lines = code.split('\n')
-    for i, line in enumerate(lines):
-        line = line.strip()
-        if line and not line.endswith((';', '{', '}', ',', ':', '//', '/*', '*/', '*/')) and not line.startswith('//'):
-            if any(line.startswith(kw) for kw in ['if', 'else', 'for', 'while', 'function', 'class', 'const', 'let', 'var']):
-                continue
-            if i < len(lines) - 1:
-                next_line = lines[i + 1].strip()
-                if not next_line.startswith(('.', '[', '(', '{', '}', ')', ']')):
-                    errors_found.append(f"Possible missing semicolon at line {i + 1}")
-    
-    return errors_found
-
-def extract_code_blocks(text: str) -> List[Dict[str, str]]:
-    """Extract code blocks from text"""
-    code_blocks = []
-    pattern = r'```(\w+)?\n(.*?)```'
-    matches = re.findall(pattern, text, re.DOTALL)
-    
-    for language, code in matches:
-        if not language:
-            language = "plaintext"
-        code_blocks.append({
-            "language": language,
-            "code": code.strip()
-        })
-    
-    return code_blocks
+@app.exception_handler(InferenceOverloaded)
+async def inference_overloaded_handler(request: Request, exc: InferenceOverloaded):
+    """Shed load with 503 and a Retry-After estimate"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": exc.reason, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 def generate_mock_response(message: str, context: Dict[str, Any]) -> str:
     """Generate a mock response when model is not available"""
@@ -297,88 +360,175 @@ def generate_mock_response(message: str, context: Dict[str, Any]) -> str:
         "help": "I can help you with Python, JavaScript, React, and more. What's your project about?"
     }
     
-    message_lower = message.lower()
+    matched = scan_keywords(message)["mock"]
     for key, response in responses.items():
-        if key in message_lower:
+        if key in matched:
             return response
     
     return "I'm here to help with your coding questions. What would you like to build today?"
 
-async def generate_ai_response(message: str, context: Dict[str, Any], user_history: List[Dict] = None) -> ChatResponse:
-    """Generate AI response using Phi-3.1 model or fallback"""
-    try:
-        # Prepare context
-        skill_level = context.get("skill_level", "intermediate")
-        preferences = context.get("preferences", {})
-        
-        # Build prompt
-        system_prompt = f"""You are an expert coding assistant. The user is a {skill_level} developer.
+def build_system_prompt(context: Dict[str, Any]) -> str:
+    """Build the system prompt, which is shared by every request with the same context"""
+    skill_level = context.get("skill_level", "intermediate")
+    preferences = context.get("preferences", {})
+    
+    system_prompt = f"""You are an expert coding assistant. The user is a {skill_level} developer.
         Preferred languages: {preferences.get('languages', ['Python', 'JavaScript'])}
         Preferred frameworks: {preferences.get('frameworks', [])}
         
         Provide helpful, accurate code examples and explanations.
         Ask clarifying questions when needed.
         Check code for errors and suggest improvements."""
-        
-        if llm:
-            # Use actual model
-            full_prompt = f"{system_prompt}\n\nUser: {message}\nAssistant:"
-            
-            response = llm(
-                full_prompt,
-                max_tokens=512,
-                temperature=0.7,
-                top_p=0.95,
-                stop=["User:", "\n\n"]
-            )
-            
-            response_text = response['choices'][0]['text'].strip()
-        else:
-            # Use mock response
-            response_text = generate_mock_response(message, context)
-        
-        # Extract code blocks
-        code_blocks = extract_code_blocks(response_text)
-        
-        # Check for syntax errors in code
-        errors_found = []
-        for block in code_blocks:
-            if block['language'] == 'python':
-                errors = check_python_syntax(block['code'])
-                errors_found.extend(errors)
-            elif block['language'] in ['javascript', 'js']:
-                errors = check_javascript_syntax(block['code'])
-                errors_found.extend(errors)
-        
-        # Generate follow-up questions
-        follow_up_questions = []
-        if "web" in message.lower() or "app" in message.lower():
-            follow_up_questions.append("Are you building a web application or mobile app?")
-        if "database" in message.lower():
-            follow_up_questions.append("Which database are you planning to use?")
-        if "api" in message.lower():
-            follow_up_questions.append("Do you need authentication for your API?")
-        
-        # Generate suggestions
-        suggestions = []
-        if code_blocks:
-            suggestions.append("Consider adding error handling to your code")
-            suggestions.append("You might want to add logging for debugging")
-            if "async" in response_text:
-                suggestions.append("Don't forget to handle async errors properly")
-        
-        return ChatResponse(
-            response=response_text,
-            suggestions=suggestions if suggestions else None,
-            code_blocks=code_blocks if code_blocks else None,
-            follow_up_questions=follow_up_questions if follow_up_questions else None,
-            error_detected=len(errors_found) > 0,
-            error_details=errors_found if errors_found else None
+    
+    return f"{system_prompt}\n\n"
+
+def build_prompt(message: str, context: Dict[str, Any]) -> str:
+    """Build the full model prompt for a user message"""
+    return f"{build_system_prompt(context)}User: {message}\nAssistant:"
+
+# Post-processing stages; each gets (message, response_text, code_blocks, streamed) and returns ChatResponse fields
+post_processing = PostProcessingPipeline()
+
+@post_processing.stage("analysis")
+async def analysis_stage(message: str, response_text: str, code_blocks: List[Dict[str, str]],
+                         streamed: Optional[StreamingAnalysis]) -> Dict[str, Any]:
+    """Check code blocks for syntax errors, all blocks in parallel in the analysis workers"""
+    if streamed is not None and streamed.analyze:
+        analyses = await streamed.results()
+    else:
+        analyses = await analysis_pool.analyze_many([(block['language'], block['code']) for block in code_blocks])
+    errors_found = []
+    skipped = []
+    for block, results in zip(code_blocks, analyses):
+        if results is None:
+            continue
+        if results.get("skipped"):
+            skipped.append(results["skipped"])
+        errors_found.extend(summarize_issues(block['language'], results))
+    return {"error_details": errors_found, "analysis_skipped": skipped}
+
+@post_processing.stage("follow_ups")
+async def follow_ups_stage(message: str, response_text: str, code_blocks: List[Dict[str, str]],
+                           streamed: Optional[StreamingAnalysis]) -> Dict[str, Any]:
+    """Generate follow-up questions"""
+    follow_up_questions = []
+    follow_ups = scan_keywords(message)["follow_up"]
+    if "app_type" in follow_ups:
+        follow_up_questions.append("Are you building a web application or mobile app?")
+    if "database" in follow_ups:
+        follow_up_questions.append("Which database are you planning to use?")
+    if "api" in follow_ups:
+        follow_up_questions.append("Do you need authentication for your API?")
+    return {"follow_up_questions": follow_up_questions}
+
+@post_processing.stage("suggestions")
+async def suggestions_stage(message: str, response_text: str, code_blocks: List[Dict[str, str]],
+                            streamed: Optional[StreamingAnalysis]) -> Dict[str, Any]:
+    """Generate suggestions"""
+    suggestions = []
+    if code_blocks:
+        suggestions.append("Consider adding error handling to your code")
+        suggestions.append("You might want to add logging for debugging")
+        if "async" in response_text:
+            suggestions.append("Don't forget to handle async errors properly")
+    return {"suggestions": suggestions}
+
+def disabled_stages(message: ChatMessage) -> Set[str]:
+    """Post-processing stages the request turned off; rejects unknown stage names"""
+    requested = message.post_processing or {}
+    unknown = set(requested) - set(post_processing.stages)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown post-processing stage(s): {', '.join(sorted(unknown))}; "
+                   f"expected {', '.join(post_processing.stages)}"
         )
+    return {name for name, enabled in requested.items() if not enabled}
+
+async def build_chat_response(message: str, response_text: str,
+                              streamed: Optional[StreamingAnalysis] = None,
+                              disabled: Set[str] = frozenset()) -> ChatResponse:
+    """Post-process generated text into a ChatResponse
+    
+    The enabled post-processing stages run concurrently. Pass the
+    StreamingAnalysis that was fed the response's tokens to reuse the code
+    blocks it found and the analyses it started during generation.
+    """
+    code_blocks = streamed.blocks if streamed is not None else extract_code_blocks(response_text)
+    fields = await post_processing.run(message, response_text, code_blocks, streamed, disabled=disabled)
+    
+    errors_found = fields.get("error_details", [])
+    suggestions = fields.get("suggestions", [])
+    for reason in fields.get("analysis_skipped", []):
+        suggestions.append(f"Code analysis skipped: {reason}")
+    follow_up_questions = fields.get("follow_up_questions", [])
+    
+    return ChatResponse(
+        response=response_text,
+        suggestions=suggestions if suggestions else None,
+        code_blocks=code_blocks if code_blocks else None,
+        follow_up_questions=follow_up_questions if follow_up_questions else None,
+        error_detected=len(errors_found) > 0,
+        error_details=errors_found if errors_found else None
+    )
+
+async def generate_ai_response(message: str, context: Dict[str, Any], user_history: List[Dict] = None,
+                               disabled: Set[str] = frozenset()) -> ChatResponse:
+    """Generate AI response using Phi-3.1 model or fallback"""
+    # Generate as a stream so code blocks are analyzed while later tokens are still decoding
+    streamed = analysis_pool.streaming(analyze="analysis" not in disabled)
+    try:
+        tokens = []
+        async for token in stream_ai_response(message, context):
+            tokens.append(token)
+            streamed.feed(token)
         
+        return await build_chat_response(message, "".join(tokens).strip(), streamed, disabled)
+        
+    except InferenceOverloaded:
+        raise
     except Exception as e:
         logger.error(f"Error generating response: {e}")
         raise HTTPException(status_code=500, detail="Error generating response")
+    finally:
+        # No-op once results were collected; stops work for failed or abandoned requests
+        streamed.cancel()
+
+async def stream_ai_response(message: str, context: Dict[str, Any]) -> AsyncIterator[str]:
+    """Stream response tokens from the model, or the mock response word by word"""
+    if inference.model_loaded:
+        async for token in inference.stream(
+            build_prompt(message, context),
+            prefix=build_system_prompt(context),
+            **GENERATION_PARAMS
+        ):
+            yield token
+    else:
+        for word in re.findall(r'\S+\s*', generate_mock_response(message, context)):
+            yield word
+
+def response_cache_key(message: str, context: Dict[str, Any], disabled: Set[str] = frozenset()) -> str:
+    """Cache key for a chat request: normalized message, context, sampling parameters and disabled stages"""
+    normalized_message = " ".join(message.split())
+    return make_cache_key(normalized_message, context, GENERATION_PARAMS, sorted(disabled))
+
+def use_response_cache(request: Request, message: ChatMessage) -> bool:
+    """Whether a request may be served from, and stored in, the response cache"""
+    cache_control = request.headers.get("cache-control", "").lower()
+    if not message.use_cache or "no-cache" in cache_control or "no-store" in cache_control:
+        return False
+    # Mock responses are cheap and must not outlive the model loading
+    return inference.model_loaded
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def json_default(value: Any) -> str:
+    """json.dumps fallback for BSON values (datetimes, ObjectIds)"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -410,129 +560,342 @@ async def root():
     return {
         "message": "Coding AI Assistant API",
         "version": "1.0.0",
-        "endpoints": ["/chat", "/history/{user_id}", "/save/{user_id}", "/suggest/{user_id}", "/health"]
+        "endpoints": ["/chat", "/chat/stream", "/analyze", "/analyze/batch", "/history/{user_id}", "/save/{user_id}", "/suggest/{user_id}", "/health", "/health/live", "/health/ready"]
     }
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    inference_stats = await inference.fetch_stats()
     health_status = {
         "status": "ok",
         "timestamp": datetime.utcnow().isoformat(),
-        "model_loaded": llm is not None,
-        "database_connected": db is not None
+        "model_loaded": inference.model_loaded,
+        "model_loading": model_loading(),
+        "database_connected": repo is not None,
+        "inference": inference_stats,
+        "response_cache": response_cache.stats(),
+        "profile_cache": profile_cache.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "analysis_pool": analysis_pool.stats(),
+        "analysis_rules": rule_stats(),
+        "post_processing": post_processing.stats(),
+        "conversation_writer": conversation_writer.stats() if conversation_writer is not None else None
     }
     return health_status
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "ok", "timestamp": datetime.utcnow().isoformat()}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: the model is loaded and MongoDB is reachable"""
+    database_reachable = False
+    if repo is not None:
+        try:
+            await repo.ping()
+            database_reachable = True
+        except Exception as e:
+            logger.warning(f"Readiness check could not reach MongoDB: {e}")
+    
+    ready = inference.model_loaded and database_reachable
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "model_loaded": inference.model_loaded,
+            "model_loading": model_loading(),
+            "database_reachable": database_reachable,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    )
+
+async def load_chat_context(user_id: str, message: ChatMessage) -> Tuple[Dict[str, Any], List[Dict]]:
+    """Build the generation context and recent history for a chat request"""
+    # Get user profile if exists
+    user_profile = None
+    user_history = []
+    topic_counts = None
+    
+    if repo is not None and user_id != "anonymous":
+        # Profile, recent conversation history and topic aggregates
+        user_profile, user_history, topic_counts = await asyncio.gather(
+            repo.users.get_by_user_id(user_id),
+            repo.conversations.recent_messages(user_id, limit=CHAT_HISTORY_MESSAGES, session_id=message.session_id),
+            repo.topic_counts(user_id)
+        )
+    
+    # Prepare context
+    context = {
+        "skill_level": message.skill_level or (user_profile.get("skill_level") if user_profile else "intermediate"),
+        "preferences": message.preferences or (user_profile.get("preferences") if user_profile else {})
+    }
+    if not context["preferences"] and topic_counts:
+        # Fall back to the languages and frameworks the user talks about most
+        context["preferences"] = preferences_from_topics(topic_counts)
+    
+    if message.context:
+        context.update(message.context)
+    
+    return context, user_history
+
+async def save_exchange(user_id: str, session_id: str, user_message: str, assistant_message: str):
+    """Queue a chat exchange for the user's session if the user is logged in
+    
+    The write happens in the background, so the response does not wait on MongoDB.
+    """
+    if conversation_writer is not None and user_id != "anonymous":
+        now = datetime.utcnow()
+        await conversation_writer.put((user_id, session_id, [
+            {"role": "user", "content": user_message, "timestamp": now},
+            {"role": "assistant", "content": assistant_message, "timestamp": now}
+        ]))
+
 @app.post("/chat", response_model=ChatResponse)
 @limiter.limit("30/minute")
-async def chat(request: Request, message: ChatMessage, user_id: Optional[str] = "anonymous"):
+async def chat(request: Request, http_response: Response, message: ChatMessage, user_id: Optional[str] = "anonymous"):
     """Main chat endpoint"""
     logger.info(f"Chat request from user {user_id}: {message.message[:100]}...")
+    disabled = disabled_stages(message)
     
     try:
-        # Get user profile if exists
-        user_profile = None
-        user_history = []
+        session_id = message.session_id or uuid.uuid4().hex
+        context, user_history = await load_chat_context(user_id, message)
+        await wait_for_model()
         
-        if db and user_id != "anonymous":
-            user_profile = db.users.find_one({"user_id": user_id})
-            
-            # Get recent conversation history
-            recent_conversations = list(db.conversations.find(
-                {"user_id": user_id}
-            ).sort("created_at", -1).limit(5))
-            
-            for conv in recent_conversations:
-                user_history.extend(conv.get("messages", []))
+        cache_key = response_cache_key(message.message, context, disabled) if use_response_cache(request, message) else None
+        response = response_cache.get(cache_key) if cache_key else None
         
-        # Prepare context
-        context = {
-            "skill_level": message.skill_level or (user_profile.get("skill_level") if user_profile else "intermediate"),
-            "preferences": message.preferences or (user_profile.get("preferences") if user_profile else {})
-        }
-        
-        if message.context:
-            context.update(message.context)
-        
-        # Generate response
-        response = await generate_ai_response(message.message, context, user_history)
+        if response is not None:
+            http_response.headers["X-Cache"] = "HIT"
+        else:
+            # Generate response
+            response = await generate_ai_response(message.message, context, user_history, disabled)
+            if cache_key:
+                response_cache.set(cache_key, response)
+            http_response.headers["X-Cache"] = "MISS"
         
         # Save conversation if user is logged in
-        if db and user_id != "anonymous":
-            conversation_entry = {
-                "user_id": user_id,
-                "session_id": hashlib.md5(f"{user_id}{datetime.utcnow()}".encode()).hexdigest(),
-                "messages": [
-                    {"role": "user", "content": message.message, "timestamp": datetime.utcnow()},
-                    {"role": "assistant", "content": response.response, "timestamp": datetime.utcnow()}
-                ],
-                "created_at": datetime.utcnow()
-            }
-            db.conversations.insert_one(conversation_entry)
+        await save_exchange(user_id, session_id, message.message, response.response)
         
         logger.info(f"Response generated for user {user_id}")
-        return response
+        # Cached responses are shared across sessions, so the id is only set on the copy returned
+        return response.copy(update={"session_id": session_id})
         
+    except InferenceOverloaded:
+        raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+@limiter.limit("30/minute")
+async def chat_stream(request: Request, message: ChatMessage, user_id: Optional[str] = "anonymous"):
+    """Streaming chat endpoint using Server-Sent Events
+    
+    Emits a `token` event per generated fragment, then a `done` event carrying
+    the full ChatResponse (code_blocks, error_details, suggestions, ...).
+    """
+    logger.info(f"Streaming chat request from user {user_id}: {message.message[:100]}...")
+    disabled = disabled_stages(message)
+    
+    session_id = message.session_id or uuid.uuid4().hex
+    context, _ = await load_chat_context(user_id, message)
+    await wait_for_model()
+    
+    cache_key = response_cache_key(message.message, context, disabled) if use_response_cache(request, message) else None
+    cached = response_cache.get(cache_key) if cache_key else None
+    
+    if cached is not None:
+        async def cached_stream():
+            await save_exchange(user_id, session_id, message.message, cached.response)
+            yield format_sse("token", {"text": cached.response})
+            yield format_sse("done", cached.copy(update={"session_id": session_id}).dict())
+        
+        return StreamingResponse(
+            cached_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Cache": "HIT"}
+        )
+    
+    # Wait for admission before the response starts so overload can still return 503
+    token_stream = stream_ai_response(message.message, context)
+    try:
+        first_token = await token_stream.__anext__()
+    except StopAsyncIteration:
+        first_token = None
+    
+    async def event_stream():
+        tokens = []
+        streamed = analysis_pool.streaming(analyze="analysis" not in disabled)
+        try:
+            if first_token is not None:
+                tokens.append(first_token)
+                streamed.feed(first_token)
+                yield format_sse("token", {"text": first_token})
+            async for token in token_stream:
+                tokens.append(token)
+                streamed.feed(token)
+                yield format_sse("token", {"text": token})
+            
+            response = await build_chat_response(message.message, "".join(tokens).strip(), streamed, disabled)
+            if cache_key:
+                response_cache.set(cache_key, response)
+            await save_exchange(user_id, session_id, message.message, response.response)
+            
+            logger.info(f"Streamed response generated for user {user_id}")
+            yield format_sse("done", response.copy(update={"session_id": session_id}).dict())
+        except Exception as e:
+            logger.error(f"Error in streaming chat endpoint: {e}")
+            yield format_sse("error", {"detail": "Error generating response"})
+        finally:
+            # Client went away before the response was built
+            streamed.cancel()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Cache": "MISS"}
+    )
+
+async def analyze_snippet(index: int, snippet: CodeSnippet) -> Dict[str, Any]:
+    """Analysis result for one snippet, tagged with its position and id"""
+    language = snippet.language.lower()
+    results = await analysis_pool.analyze(language, snippet.code)
+    if results is None:
+        results = skipped_result(f"unsupported language '{snippet.language}'")
+    return {"index": index, "id": snippet.id, "language": language, **results}
+
+@app.post("/analyze")
+@limiter.limit("60/minute")
+async def analyze_code(request: Request, snippet: CodeSnippet):
+    """Check one code snippet without running inference"""
+    return await analyze_snippet(0, snippet)
+
+@app.post("/analyze/batch")
+@limiter.limit("10/minute")
+async def analyze_batch(request: Request, batch: AnalyzeBatchRequest, stream: bool = False):
+    """Check many code snippets at once across the analysis workers
+    
+    Results are returned in input order. With `stream=true` they are sent as
+    NDJSON, each line as soon as it and every snippet before it are done.
+    """
+    if len(batch.snippets) > ANALYZE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {ANALYZE_BATCH_MAX} snippets per batch")
+    
+    if not stream:
+        results = await asyncio.gather(*(analyze_snippet(i, snippet) for i, snippet in enumerate(batch.snippets)))
+        return {"results": results}
+    
+    async def ndjson_lines():
+        tasks = [asyncio.create_task(analyze_snippet(i, snippet)) for i, snippet in enumerate(batch.snippets)]
+        try:
+            for task in tasks:
+                yield (json.dumps(await task) + "\n").encode()
+        finally:
+            # Client went away: drop the snippets not yet analyzed
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 @app.get("/history/{user_id}")
 @limiter.limit("10/minute")
-async def get_history(request: Request, user_id: str, limit: int = 50):
-    """Get conversation history for a user"""
+async def get_history(request: Request, user_id: str, limit: int = 50,
+                      before: Optional[str] = None, after: Optional[str] = None):
+    """Get conversation history for a user, newest first
+    
+    Pass `next_cursor` as `before` to page to older history and `prev_cursor`
+    as `after` to page back to newer history.
+    """
     logger.info(f"History request for user {user_id}")
     
-    if not db:
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either 'before' or 'after', not both")
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    
+    if repo is None:
         return {"error": "Database not available", "history": []}
     
     try:
-        conversations = list(db.conversations.find(
-            {"user_id": user_id}
-        ).sort("created_at", -1).limit(limit))
+        conversations, has_more = await repo.conversations.page(user_id, limit, before=before, after=after)
+        
+        # Paging forward always leaves older buckets behind; paging back always leaves newer ones
+        older = has_more if not after else True
+        newer = has_more if after else bool(before)
+        next_cursor = encode_cursor(conversations[-1]) if conversations and older else None
+        prev_cursor = encode_cursor(conversations[0]) if conversations and newer else None
         
         # Convert ObjectId to string
         for conv in conversations:
             conv["_id"] = str(conv["_id"])
             conv["created_at"] = conv["created_at"].isoformat()
+            if "updated_at" in conv:
+                conv["updated_at"] = conv["updated_at"].isoformat()
             for msg in conv.get("messages", []):
                 if "timestamp" in msg:
                     msg["timestamp"] = msg["timestamp"].isoformat()
         
-        return {"user_id": user_id, "history": conversations}
+        return {"user_id": user_id, "history": conversations, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
         
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     except Exception as e:
         logger.error(f"Error fetching history: {e}")
         raise HTTPException(status_code=500, detail="Error fetching history")
 
+@app.get("/history/{user_id}/export")
+@limiter.limit("5/minute")
+async def export_history(request: Request, user_id: str, compress: bool = False):
+    """Stream a user's full conversation history as NDJSON (one session bucket per line)
+    
+    Documents are serialized as they arrive from the cursor, so memory use does
+    not grow with the size of the history. `compress=true` gzips the stream.
+    """
+    logger.info(f"History export for user {user_id}")
+    
+    if repo is None:
+        raise HTTPException(status_code=503, detail="Database not available")
+    
+    async def ndjson_lines():
+        async for conv in repo.conversations.iter_all(user_id, batch_size=EXPORT_BATCH_SIZE):
+            yield (json.dumps(conv, default=json_default) + "\n").encode()
+    
+    async def gzip_stream():
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        async for line in ndjson_lines():
+            chunk = compressor.compress(line)
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+    
+    filename = f"history-{user_id}.ndjson" + (".gz" if compress else "")
+    return StreamingResponse(
+        gzip_stream() if compress else ndjson_lines(),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.post("/save/{user_id}")
 @limiter.limit("20/minute")
 async def save_conversation(request: Request, user_id: str, conversation: ConversationHistory):
     """Save a conversation"""
     logger.info(f"Save conversation for user {user_id}")
     
-    if not db:
+    if repo is None:
         return {"error": "Database not available", "saved": False}
     
     try:
         # Save user profile if not exists
-        existing_user = db.users.find_one({"user_id": user_id})
-        if not existing_user:
-            db.users.insert_one({
-                "user_id": user_id,
-                "skill_level": "intermediate",
-                "preferences": {},
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            })
+        await repo.users.ensure_profile(user_id)
         
-        # Save conversation
-        conv_dict = conversation.dict()
-        conv_dict["user_id"] = user_id
-        result = db.conversations.insert_one(conv_dict)
+        # Append to the session's buckets
+        conversation_id = await repo.conversations.append(user_id, conversation.session_id, conversation.messages)
+        await repo.topics.increment(user_id, conversation.messages)
         
-        return {"saved": True, "conversation_id": str(result.inserted_id)}
+        return {"saved": True, "conversation_id": conversation_id, "session_id": conversation.session_id}
         
     except Exception as e:
         logger.error(f"Error saving conversation: {e}")
@@ -552,27 +915,13 @@ async def get_suggestions(request: Request, user_id: str):
     }
     
     # Get user profile and history
-    if db:
-        user_profile = db.users.find_one({"user_id": user_id})
-        recent_conversations = list(db.conversations.find(
-            {"user_id": user_id}
-        ).sort("created_at", -1).limit(10))
+    if repo is not None:
+        user_profile, topic_counts = await asyncio.gather(
+            repo.users.get_by_user_id(user_id),
+            repo.topic_counts(user_id)
+        )
         
-        # Analyze conversation topics
-        topics = set()
-        for conv in recent_conversations:
-            for msg in conv.get("messages", []):
-                content = msg.get("content", "").lower()
-                if "python" in content:
-                    topics.add("python")
-                if "javascript" in content or "js" in content:
-                    topics.add("javascript")
-                if "react" in content:
-                    topics.add("react")
-                if "api" in content:
-                    topics.add("api")
-                if "database" in content or "mongodb" in content:
-                    topics.add("database")
+        topics = {topic for topic, count in topic_counts.items() if count > 0}
         
         # Generate personalized suggestions
         if "python" in topics:
@@ -647,15 +996,15 @@ async def get_suggestions(request: Request, user_id: str):
 @app.post("/auth/register")
 async def register(user: UserAuth):
     """Register a new user (optional feature)"""
-    if not db:
+    if repo is None:
         raise HTTPException(status_code=503, detail="Database not available")
     
     # Check if user exists
-    if db.users.find_one({"username": user.username}):
+    if await repo.users.get_by_username(user.username):
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    # Hash password
-    hashed_password = pwd_context.hash(user.password)
+    # Hash password (bcrypt is CPU-bound, keep it off the event loop)
+    hashed_password = await asyncio.to_thread(pwd_context.hash, user.password)
     
     # Create user
     user_doc = {
@@ -668,7 +1017,7 @@ async def register(user: UserAuth):
         "updated_at": datetime.utcnow()
     }
     
-    db.users.insert_one(user_doc)
+    await repo.users.create(user_doc)
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -681,16 +1030,16 @@ async def register(user: UserAuth):
 @app.post("/auth/login")
 async def login(user: UserAuth):
     """Login endpoint (optional feature)"""
-    if not db:
+    if repo is None:
         raise HTTPException(status_code=503, detail="Database not available")
     
     # Find user
-    user_doc = db.users.find_one({"username": user.username})
+    user_doc = await repo.users.get_by_username(user.username)
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Verify password
-    if not pwd_context.verify(user.password, user_doc.get("hashed_password", "")):
+    if not await asyncio.to_thread(pwd_context.verify, user.password, user_doc.get("hashed_password", "")):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create access token
@@ -0,0 +1,69 @@
+"""
+Response post-processing pipeline for the Coding AI Assistant
+Independent stages run concurrently on each generated response, with per-stage latency counters
+"""
+
+import time
+import asyncio
+from typing import Dict, Any, Callable, Awaitable, Iterable
+
+Stage = Callable[..., Awaitable[Dict[str, Any]]]
+
+
+class PostProcessingPipeline:
+    """Runs registered stages concurrently and merges the fields they return
+
+    Stages must not depend on each other's output; each gets the same
+    arguments and returns a dict of ChatResponse fields. Callers may skip
+    any stage for a request.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def stage(self, name: str) -> Callable[[Stage], Stage]:
+        """Decorator registering an async stage under `name`"""
+        def register(fn: Stage) -> Stage:
+            self.stages[name] = fn
+            self._stats[name] = {"runs": 0, "skipped": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            return fn
+        return register
+
+    async def _timed(self, name: str, *args: Any) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            return await self.stages[name](*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats = self._stats[name]
+            stats["runs"] += 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    async def run(self, *args: Any, disabled: Iterable[str] = ()) -> Dict[str, Any]:
+        """Run every enabled stage with `args`; returns their merged fields"""
+        disabled = set(disabled)
+        names = []
+        for name in self.stages:
+            if name in disabled:
+                self._stats[name]["skipped"] += 1
+            else:
+                names.append(name)
+
+        fields: Dict[str, Any] = {}
+        for result in await asyncio.gather(*(self._timed(name, *args) for name in names)):
+            fields.update(result)
+        return fields
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-stage run/skip counts and latency"""
+        return {
+            name: {
+                "runs": stats["runs"],
+                "skipped": stats["skipped"],
+                "avg_ms": round(1000 * stats["total_seconds"] / stats["runs"], 3) if stats["runs"] else 0.0,
+                "max_ms": round(1000 * stats["max_seconds"], 3),
+            }
+            for name, stats in self._stats.items()
+        }
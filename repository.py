@@ -0,0 +1,437 @@
+"""
+Async MongoDB data layer for the Coding AI Assistant
+All database access from the API goes through these repositories (motor-based)
+"""
+
+import json
+import uuid
+import base64
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from cache import LRUCache
+from topics import count_topics
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING, UpdateOne, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque pagination cursor for a document's (created_at, _id) position"""
+    raw = json.dumps({"c": doc["created_at"].isoformat(), "i": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["c"]), ObjectId(data["i"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class UserRepository:
+    """User profiles and credentials
+
+    Lookups by user_id go through an optional in-process cache (including
+    "no profile" results); every write through this class invalidates the
+    affected entry, and the TTL bounds staleness from writes in other workers.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, cache: Optional[LRUCache] = None):
+        self.collection = collection
+        self.cache = cache
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a cached profile after it has been written"""
+        if self.cache is not None:
+            self.cache.invalidate(user_id)
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index([("user_id", ASCENDING)], unique=True)
+
+    async def get_by_user_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a profile by user_id"""
+        if self.cache is None:
+            return await self.collection.find_one({"user_id": user_id})
+        profile = self.cache.get(user_id, _MISSING)
+        if profile is _MISSING:
+            profile = await self.collection.find_one({"user_id": user_id})
+            self.cache.set(user_id, profile)
+        return profile
+
+    async def get_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        """Fetch a registered user by username"""
+        return await self.collection.find_one({"username": username})
+
+    async def create(self, user_doc: Dict[str, Any]) -> str:
+        """Insert a new user document and return its id"""
+        result = await self.collection.insert_one(user_doc)
+        self.invalidate(user_doc["user_id"])
+        return str(result.inserted_id)
+
+    async def ensure_profile(self, user_id: str, skill_level: str = "intermediate") -> None:
+        """Create a default profile for user_id if none exists"""
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"user_id": user_id},
+            {"$setOnInsert": {
+                "user_id": user_id,
+                "skill_level": skill_level,
+                "preferences": {},
+                "created_at": now,
+                "updated_at": now
+            }},
+            upsert=True
+        )
+        self.invalidate(user_id)
+
+
+class ConversationRepository:
+    """Conversation sessions stored as buckets of at most bucket_size messages
+
+    Each document holds one slice of a session: {user_id, session_id, seq,
+    messages, count, created_at, updated_at}. Messages are only ever appended
+    to the session's newest bucket (highest seq), filling it before the next
+    one is started, so every older bucket is full and reading buckets in seq
+    order returns messages in the order they were appended.
+
+    Every stored message has an "id". Messages already stored in the session
+    are skipped, so retrying an append that partly or fully succeeded (e.g.
+    a timeout after the server committed) never duplicates history.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, bucket_size: int = 100):
+        self.collection = collection
+        self.bucket_size = bucket_size
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index([("user_id", ASCENDING), ("updated_at", DESCENDING), ("seq", DESCENDING)])
+        # Unique so concurrent writers cannot both start the same bucket; documents from
+        # before bucketing have no seq and are left out of the index
+        await self.collection.create_index(
+            [("user_id", ASCENDING), ("session_id", ASCENDING), ("seq", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"seq": {"$exists": True}}
+        )
+        try:
+            # Superseded by the unique index above
+            await self.collection.drop_index("user_id_1_session_id_1_seq_-1")
+        except OperationFailure:
+            pass
+        await self.collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
+
+    @staticmethod
+    def _assign_ids(messages: List[Dict[str, Any]]) -> None:
+        """Give messages without an id one, in place, so retries of the same entries reuse it"""
+        for message in messages:
+            if "id" not in message:
+                message["id"] = uuid.uuid4().hex
+
+    async def _append_session(self, user_id: str, session_id: str,
+                              messages: List[Dict[str, Any]]) -> Optional[ObjectId]:
+        """Fill the session's newest bucket, then start new buckets for the rest
+
+        Returns the _id of the bucket now holding the session's last message.
+        """
+        stored = set()
+        cursor = self.collection.find(
+            {"user_id": user_id, "session_id": session_id, "messages.id": {"$in": [m["id"] for m in messages]}},
+            {"messages.id": 1}
+        )
+        async for bucket in cursor:
+            stored.update(message.get("id") for message in bucket.get("messages", []))
+        messages = [message for message in messages if message["id"] not in stored]
+
+        while True:
+            newest = await self.collection.find_one(
+                {"user_id": user_id, "session_id": session_id},
+                {"seq": 1, "count": 1},
+                sort=[("seq", DESCENDING), ("_id", DESCENDING)]
+            )
+            if not messages:
+                return newest["_id"] if newest else None
+            now = datetime.utcnow()
+            remaining = messages
+            seq = 0
+            if newest is not None:
+                seq = newest.get("seq", -1) + 1
+                # Documents from before bucketing have no count and are never appended to
+                count = newest.get("count", self.bucket_size)
+                fill = messages[:max(self.bucket_size - count, 0)]
+                if fill:
+                    # Guarded on count so a concurrent append cannot be overtaken
+                    result = await self.collection.update_one(
+                        {"_id": newest["_id"], "count": count},
+                        {
+                            "$push": {"messages": {"$each": fill}},
+                            "$inc": {"count": len(fill)},
+                            "$set": {"updated_at": now}
+                        }
+                    )
+                    if result.matched_count == 0:
+                        continue  # Another writer appended first; re-read the newest bucket
+                    remaining = messages[len(fill):]
+
+            buckets = [
+                {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "seq": seq + i,
+                    "messages": remaining[start:start + self.bucket_size],
+                    "count": len(remaining[start:start + self.bucket_size]),
+                    "created_at": now,
+                    "updated_at": now
+                }
+                for i, start in enumerate(range(0, len(remaining), self.bucket_size))
+            ]
+            if not buckets:
+                return newest["_id"]
+            try:
+                result = await self.collection.insert_many(buckets)
+            except BulkWriteError as e:
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+                # Another writer started a bucket with the same seq first; keep whatever
+                # was inserted before the conflict and re-read the newest bucket
+                messages = remaining[e.details.get("nInserted", 0) * self.bucket_size:]
+                continue
+            return result.inserted_ids[-1]
+
+    async def append(self, user_id: str, session_id: str, messages: List[Dict[str, Any]]) -> Optional[str]:
+        """Append messages to the session's newest bucket, starting new buckets as needed
+
+        Returns the id of the bucket holding the last message, or None for an empty session.
+        """
+        self._assign_ids(messages)
+        bucket_id = await self._append_session(user_id, session_id, messages)
+        return str(bucket_id) if bucket_id is not None else None
+
+    async def append_many(self, entries: List[Tuple[str, str, List[Dict[str, Any]]]]) -> None:
+        """Append a batch of (user_id, session_id, messages) entries
+
+        Entries for the same session are merged in order first; sessions are
+        written concurrently. Message ids are assigned in place, so the
+        write-behind buffer can safely retry the same batch. Raises the first error once every session's
+        write has finished, so a retry never overlaps a write still in flight.
+        """
+        sessions: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for user_id, session_id, messages in entries:
+            self._assign_ids(messages)
+            sessions.setdefault((user_id, session_id), []).extend(messages)
+        results = await asyncio.gather(
+            *(self._append_session(user_id, session_id, messages)
+              for (user_id, session_id), messages in sessions.items()),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    async def page(self, user_id: str, limit: int, before: Optional[str] = None,
+                   after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """One page of session buckets ordered newest first by (created_at, _id)
+
+        `before` returns the buckets older than the cursor, `after` the ones
+        newer than it. Seeks on the (user_id, created_at, _id) index, so every
+        page costs the same regardless of depth. Returns the page and whether
+        more buckets exist beyond it in the requested direction.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        cursor = before or after
+        if cursor:
+            created_at, object_id = decode_cursor(cursor)
+            op = "$lt" if before else "$gt"
+            query["$or"] = [
+                {"created_at": {op: created_at}},
+                {"created_at": created_at, "_id": {op: object_id}}
+            ]
+        order = DESCENDING if not after else ASCENDING
+        found = await (self.collection.find(query)
+                       .sort([("created_at", order), ("_id", order)])
+                       .limit(limit + 1)
+                       .to_list(length=limit + 1))
+        has_more = len(found) > limit
+        found = found[:limit]
+        if after:
+            found.reverse()
+        return found, has_more
+
+    async def iter_all(self, user_id: str, batch_size: int = 500) -> AsyncIterator[Dict[str, Any]]:
+        """Every session bucket for a user, oldest first, fetched from the server batch_size at a time"""
+        cursor = (self.collection.find({"user_id": user_id})
+                  .sort([("created_at", ASCENDING), ("_id", ASCENDING)])
+                  .batch_size(batch_size))
+        try:
+            async for doc in cursor:
+                yield doc
+        finally:
+            await cursor.close()
+
+    async def recent_messages(self, user_id: str, limit: int, session_id: Optional[str] = None,
+                              before: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """The last `limit` messages for a user (or one of their sessions), oldest first
+
+        With `before`, only messages stored before that time are returned.
+        """
+        query: Dict[str, Any] = {"user_id": user_id}
+        if session_id:
+            query["session_id"] = session_id
+        if before is not None:
+            query["created_at"] = {"$lt": before}
+        # The open bucket may hold fewer than `limit` messages, so read one bucket more than strictly needed
+        buckets = -(-limit // self.bucket_size) + 1
+        cursor = (self.collection.find(query, {"messages": {"$slice": -limit}})
+                  .sort([("updated_at", DESCENDING), ("seq", DESCENDING)]).limit(buckets))
+        messages: List[Dict[str, Any]] = []
+        for bucket in reversed(await cursor.to_list(length=buckets)):
+            messages.extend(bucket.get("messages", []))
+        if before is not None:
+            messages = [m for m in messages
+                        if not isinstance(m.get("timestamp"), datetime) or m["timestamp"] < before]
+        return messages[-limit:]
+
+
+class TopicRepository:
+    """Per-user topic counters, one small document per user
+
+    {user_id, counts: {topic: messages}, since, seeded, updated_at};
+    incremented as messages are stored so readers never scan conversation
+    history. `since` records when counting started for the user, and
+    `seeded` that their history from before then has been added once.
+    Increments are not idempotent, so only operations the server reports
+    as failed are retried and the counts are approximate.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    async def ensure_indexes(self) -> None:
+        await self.collection.create_index([("user_id", ASCENDING)], unique=True)
+
+    async def get(self, user_id: str) -> Optional[Dict[str, int]]:
+        """Topic counts for a user, or None if nothing has been aggregated yet"""
+        doc = await self.collection.find_one({"user_id": user_id}, {"counts": 1})
+        return doc.get("counts", {}) if doc else None
+
+    async def get_state(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """The user's counts together with `since` and `seeded`, or None if nothing has been aggregated yet"""
+        return await self.collection.find_one({"user_id": user_id}, {"counts": 1, "since": 1, "seeded": 1})
+
+    def _update(self, counts: Dict[str, int], since: datetime) -> Dict[str, Any]:
+        update: Dict[str, Any] = {"$set": {"updated_at": datetime.utcnow()}, "$setOnInsert": {"since": since}}
+        if counts:
+            update["$inc"] = {f"counts.{topic}": n for topic, n in counts.items()}
+        else:
+            update["$setOnInsert"]["counts"] = {}
+        return update
+
+    def _increment_op(self, user_id: str, counts: Dict[str, int], since: datetime) -> UpdateOne:
+        return UpdateOne({"user_id": user_id}, self._update(counts, since), upsert=True)
+
+    async def increment(self, user_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Count the topics of newly stored messages"""
+        await self.increment_many([(user_id, messages)])
+
+    async def increment_many(self, entries: List[Tuple[str, List[Dict[str, Any]]]], retries: int = 2) -> None:
+        """Count the topics of a batch of (user_id, messages) entries in one bulk write
+
+        Operations listed as failed in a BulkWriteError (e.g. two upserts
+        racing on a new user) were not applied and are retried up to
+        `retries` times; any other error may follow a partial write and is
+        raised without retrying.
+        """
+        totals: Dict[str, Dict[str, int]] = {}
+        # Earliest counted message per user, so seeding never counts these messages again
+        since: Dict[str, datetime] = {}
+        now = datetime.utcnow()
+        for user_id, messages in entries:
+            user_counts = totals.setdefault(user_id, {})
+            for topic, n in count_topics(messages).items():
+                user_counts[topic] = user_counts.get(topic, 0) + n
+            for message in messages:
+                # Clients saving via /save may send timestamps as strings
+                timestamp = message.get("timestamp")
+                if not isinstance(timestamp, datetime):
+                    timestamp = now
+                since[user_id] = min(since.get(user_id, timestamp), timestamp)
+        ops = [self._increment_op(user_id, counts, since.get(user_id, now))
+               for user_id, counts in totals.items()]
+        for attempt in range(retries + 1):
+            if not ops:
+                return
+            try:
+                await self.collection.bulk_write(ops, ordered=False)
+                return
+            except BulkWriteError as e:
+                if attempt == retries:
+                    raise
+                ops = [ops[error["index"]] for error in e.details.get("writeErrors", [])]
+
+    async def seed(self, user_id: str, counts: Dict[str, int]) -> Dict[str, int]:
+        """Add counts from history stored before `since`, at most once per user; returns the totals
+
+        Works whether or not increments have already created the document.
+        """
+        # `since` only applies if no increment has created the document yet
+        update = self._update(counts, datetime.utcnow())
+        update["$set"]["seeded"] = True
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"user_id": user_id, "seeded": {"$ne": True}},
+                update,
+                projection={"counts": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Already seeded by a concurrent request
+            return await self.get(user_id) or {}
+        return doc.get("counts", {})
+
+
+class MongoRepository:
+    """Owns the motor client and exposes the per-collection repositories"""
+
+    def __init__(self, uri: str, db_name: str = "coding_assistant", timeout_ms: int = 5000,
+                 bucket_size: int = 100, profile_cache: Optional[LRUCache] = None):
+        self.client = AsyncIOMotorClient(uri, serverSelectionTimeoutMS=timeout_ms)
+        self.db: AsyncIOMotorDatabase = self.client[db_name]
+        self.users = UserRepository(self.db.users, cache=profile_cache)
+        self.conversations = ConversationRepository(self.db.conversations, bucket_size=bucket_size)
+        self.topics = TopicRepository(self.db.user_topics)
+
+    async def topic_counts(self, user_id: str, history_limit: int = 20) -> Dict[str, int]:
+        """A user's topic counts, first adding their recent history from before aggregation if needed"""
+        state = await self.topics.get_state(user_id)
+        if state is not None and state.get("seeded"):
+            return state.get("counts", {})
+        before = state.get("since") if state else None
+        history = await self.conversations.recent_messages(
+            user_id, limit=history_limit, before=before or datetime.utcnow()
+        )
+        return await self.topics.seed(user_id, count_topics(history))
+
+    async def ping(self) -> None:
+        """Raise if the server cannot be reached"""
+        await self.client.admin.command('ping')
+
+    async def ensure_indexes(self) -> None:
+        await self.users.ensure_indexes()
+        await self.conversations.ensure_indexes()
+        await self.topics.ensure_indexes()
+
+    def close(self) -> None:
+        self.client.close()
@@ -0,0 +1,123 @@
+"""
+Tests for the code analysis engine
+"""
+
+import ast
+import asyncio
+
+from analysis import (analyze_python, analyze_javascript, summarize_python_issues,
+                      summarize_javascript_issues, summarize_issues, analysis_cache,
+                      PythonASTAnalyzer, Rule, rule_stats)
+from analysis_pool import AnalysisPool
+from cache import LRUCache
+
+
+def test_reports_syntax_error():
+    """Syntax errors are reported with their line"""
+    results = analyze_python("def f(:\n    pass\n")
+    assert not results["valid"]
+    assert summarize_python_issues(results) == ["Syntax error at line 1: invalid syntax"]
+
+
+def test_missing_imports_reported_once():
+    """Each unimported common module is reported once, at its first use"""
+    code = "import sys\nx = os.getcwd()\ny = os.sep\nprint(sys.argv, json.dumps(x))\n"
+    results = analyze_python(code)
+    assert summarize_python_issues(results) == ["Missing import: os", "Missing import: json"]
+    assert [w["line"] for w in results["warnings"]] == [2, 4]
+
+
+def test_imports_in_any_form_count():
+    """Dotted, aliased, from-imports and later imports all satisfy the check"""
+    code = "def f():\n    return os.sep, j.dumps, datetime.now()\nimport os.path\nimport json as j\nfrom datetime import datetime\n"
+    assert summarize_python_issues(analyze_python(code)) == []
+
+
+def test_rules_see_only_their_node_types_in_source_order():
+    """Each rule receives just the nodes it declares, depth-first in source order"""
+    seen = []
+
+    class ReturnRule(Rule):
+        name = "test_return"
+        node_types = (ast.FunctionDef, ast.Return)
+
+        def visit(self, node, report):
+            seen.append((type(node).__name__, node.lineno))
+
+    analyzer = PythonASTAnalyzer(rules=[ReturnRule])
+    analyzer.visit(ast.parse("def f():\n    return 1\nx = 2\ndef g():\n    return 3\n"))
+    analyzer.finish()
+    assert seen == [("FunctionDef", 1), ("Return", 2), ("FunctionDef", 4), ("Return", 5)]
+    assert rule_stats()["test_return"]["calls"] >= 5  # 4 visits and finish()
+
+
+def test_results_memoized_by_content():
+    """Re-analyzing identical code is served from the content-hash cache"""
+    code = "def cached_example():\n    return os.sep\n"
+    first = analyze_python(code)
+    hits = analysis_cache.hits
+    assert analyze_python(code) is first
+    assert analysis_cache.hits == hits + 1
+
+
+def test_cache_evicts_by_bytes():
+    """The cache stays under its byte budget by evicting least recently used results"""
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.get("a")
+    cache.set("c", "xxxx")
+    assert cache.get("b") is None
+    assert cache.get("a") == "xxxx"
+    assert cache.stats()["bytes"] == 8
+
+
+def test_javascript_ignores_brackets_in_literals():
+    """Brackets inside strings, comments, regex and template literals are not counted"""
+    code = "const s = '(';\n// }\nconst r = /[)]/g;\nconst t = `${ {a: 1}.a } )`;\n"
+    results = analyze_javascript(code)
+    assert results["valid"]
+    assert summarize_javascript_issues(results) == []
+
+
+def test_javascript_jsx_text_is_not_code():
+    """Apostrophes and brackets in JSX element text are not reported as broken literals"""
+    code = (
+        "const msg = <p>It's fine</p>;\n"
+        "function Todo({ name, items }) {\n"
+        "  return (\n"
+        "    <div className=\"todo\">\n"
+        "      <p>Don't forget {name}'s list (all of it)</p>\n"
+        "      {items.map(item => <Item key={item.id} label='item' />)}\n"
+        "      <>That's all</>\n"
+        "    </div>\n"
+        "  );\n"
+        "}\n"
+        "const ratio = a < b ? 1 : 2;\n"
+    )
+    results = analyze_javascript(code)
+    assert results["valid"]
+    assert summarize_javascript_issues(results) == []
+
+
+def test_javascript_semicolon_hints_only_for_asi_hazards():
+    """Semicolon-free code is fine; only lines that ASI joins are flagged"""
+    code = "const a = 1\nconst b = a\n(a || b).toString()\n"
+    assert summarize_javascript_issues(analyze_javascript(code)) == [
+        "Possible missing semicolon at line 2: line 3 starts with '(' and continues the statement"
+    ]
+
+
+def test_pool_analyzes_in_workers_and_skips_oversized():
+    """Blocks run in worker processes; oversized ones and unknown languages are skipped"""
+    pool = AnalysisPool(max_workers=1, timeout=30, max_code_bytes=100)
+    try:
+        results = asyncio.run(pool.analyze_many([
+            ("python", "def g(:\n"), ("rust", "fn main() {}"), ("python", "x = 1\n" * 50)
+        ]))
+    finally:
+        pool.shutdown()
+    assert summarize_issues("python", results[0]) == ["Syntax error at line 1: invalid syntax"]
+    assert results[1] is None
+    assert results[2]["skipped"] == "code block larger than 100 bytes"
+    assert pool.stats()["analyzed"] == 1
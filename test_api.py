@@ -18,6 +18,25 @@ def test_health():
     assert response.json()["status"] == "ok"
     print("✓ Health check passed\n")
 
+def test_liveness():
+    """Test liveness probe"""
+    print("Testing /health/live endpoint...")
+    response = requests.get(f"{BASE_URL}/health/live")
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ok"
+    print("✓ Liveness check passed\n")
+
+def test_readiness():
+    """Test readiness probe"""
+    print("Testing /health/ready endpoint...")
+    response = requests.get(f"{BASE_URL}/health/ready")
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}")
+    assert response.status_code in (200, 503)
+    assert response.json()["ready"] == (response.status_code == 200)
+    print("✓ Readiness check passed\n")
+
 def test_chat():
     """Test chat endpoint"""
     print("Testing /chat endpoint...")
@@ -40,6 +59,58 @@ def test_chat():
     assert response.status_code == 200
     print("✓ Chat endpoint passed\n")
 
+def test_chat_stream():
+    """Test streaming chat endpoint"""
+    print("Testing /chat/stream endpoint...")
+    payload = {
+        "message": "How do I create a REST API in Python?",
+        "skill_level": "intermediate"
+    }
+    
+    response = requests.post(
+        f"{BASE_URL}/chat/stream",
+        json=payload,
+        params={"user_id": "test_user"},
+        stream=True
+    )
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    
+    events = []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            events.append(line[len("event: "):])
+        elif line.startswith("data: ") and events[-1] == "done":
+            final = json.loads(line[len("data: "):])
+    print(f"Events: {events}")
+    assert events[0] == "token"
+    assert events[-1] == "done"
+    assert "response" in final
+    print("✓ Chat stream endpoint passed\n")
+
+def test_analyze_batch():
+    """Test batch code analysis endpoint"""
+    print("Testing /analyze/batch endpoint...")
+    payload = {"snippets": [
+        {"language": "python", "code": "def f(:\n    pass\n", "id": "a.py"},
+        {"language": "javascript", "code": "const x = [1, 2];\n"},
+        {"language": "cobol", "code": "DISPLAY 'HI'."}
+    ]}
+    response = requests.post(f"{BASE_URL}/analyze/batch", json=payload)
+    print(f"Status: {response.status_code}")
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["index"] for r in results] == [0, 1, 2]
+    assert results[0]["id"] == "a.py" and not results[0]["valid"]
+    assert results[1]["valid"]
+    assert "skipped" in results[2]
+    
+    response = requests.post(f"{BASE_URL}/analyze/batch", json=payload, params={"stream": "true"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in response.iter_lines()] == results
+    print("✓ Batch analysis endpoint passed\n")
+
 def test_history():
     """Test history endpoint"""
     print("Testing /history endpoint...")
@@ -66,7 +137,11 @@ def run_tests():
     
     try:
         test_health()
+        test_liveness()
+        test_readiness()
         test_chat()
+        test_chat_stream()
+        test_analyze_batch()
         time.sleep(1)  # Avoid rate limiting
         test_history()
         test_suggestions()
@@ -0,0 +1,136 @@
+"""
+Tests for the continuous batching scheduler against a scripted fake model
+"""
+
+import ctypes
+import sys
+import types
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from batching import BatchScheduler, BatchRequest
+
+EOS = 0
+N_VOCAB = 128
+
+
+class FakeLlama:
+    """Character-level model that continues each prompt with a scripted reply
+
+    Tokens are character codes. The KV cache is a token list per sequence,
+    and decode results can be forced, or derived from a cap on batch size.
+    """
+
+    def __init__(self, replies, n_batch=16, max_decode_tokens=None):
+        self.replies = replies
+        self.n_batch = n_batch
+        self.max_decode_tokens = max_decode_tokens
+        self.results = []  # Forced llama_decode return values, consumed first
+        self.decode_sizes = []
+        self.kv = {}
+        self.batch = None
+        self.ctx = self
+
+    def n_ctx(self):
+        return 512
+
+    def n_vocab(self):
+        return N_VOCAB
+
+    def token_eos(self):
+        return EOS
+
+    def reset(self):
+        pass
+
+    def tokenize(self, text):
+        return list(text)
+
+    def detokenize(self, tokens):
+        return bytes(tokens)
+
+    def decode(self, batch):
+        self.decode_sizes.append(batch.n_tokens)
+        if self.results:
+            result = self.results.pop(0)
+        elif self.max_decode_tokens is not None and batch.n_tokens > self.max_decode_tokens:
+            result = 1
+        else:
+            result = 0
+        if result == 0:
+            self.batch = batch
+            for i in range(batch.n_tokens):
+                cells = self.kv.setdefault(batch.seq_id[i][0], [])
+                assert batch.pos[i] == len(cells), "token decoded at a position already in the KV cache"
+                cells.append(batch.token[i])
+        return result
+
+    def logits(self, index):
+        text = bytes(self.kv[self.batch.seq_id[index][0]]).decode()
+        prompt = next(prompt for prompt in self.replies if text.startswith(prompt))
+        reply = self.replies[prompt]
+        generated = len(text) - len(prompt)
+        values = (ctypes.c_float * N_VOCAB)()
+        values[ord(reply[generated]) if generated < len(reply) else EOS] = 1.0
+        self._logits = values
+        return ctypes.cast(values, ctypes.POINTER(ctypes.c_float))
+
+    def seq_rm(self, seq_id, start, end):
+        assert end == -1
+        cells = self.kv.get(seq_id, [])
+        del cells[max(start, 0):]
+
+
+def fake_llama_cpp(llm):
+    module = types.ModuleType("llama_cpp")
+    module.llama_batch_init = lambda n_tokens, embd, n_seq_max: types.SimpleNamespace(
+        token=[0] * n_tokens, pos=[0] * n_tokens, seq_id=[[0] for _ in range(n_tokens)],
+        n_seq_id=[0] * n_tokens, logits=[False] * n_tokens, n_tokens=0
+    )
+    module.llama_decode = lambda ctx, batch: ctx.decode(batch)
+    module.llama_get_logits_ith = lambda ctx, index: ctx.logits(index)
+    module.llama_kv_cache_seq_rm = lambda ctx, seq_id, start, end: ctx.seq_rm(seq_id, start, end)
+    module.llama_kv_cache_clear = lambda ctx: ctx.kv.clear()
+    return module
+
+
+def run(monkeypatch, llm, prompts, stop=None):
+    """Run the prompts to completion; returns the events each one emitted"""
+    monkeypatch.setitem(sys.modules, "llama_cpp", fake_llama_cpp(llm))
+    scheduler = BatchScheduler(llm, max_sequences=len(prompts), seed=0)
+    events = {prompt: [] for prompt in prompts}
+    for prompt in prompts:
+        params = {"max_tokens": 32, "temperature": 0, "stop": stop}
+        emit = lambda event, payload, prompt=prompt: events[prompt].append((event, payload))
+        scheduler.submit(BatchRequest(prompt, params, emit))
+    scheduler.run()
+    return events
+
+
+def test_holds_back_possible_stop_sequence_prefixes(monkeypatch):
+    """Text that could start a stop sequence is emitted only once it cannot"""
+    llm = FakeLlama({"Q:": "aEbENcENDxyz"})
+    events = run(monkeypatch, llm, ["Q:"], stop=["END"])
+    assert events["Q:"] == [("token", "a"), ("token", "Eb"), ("token", "ENc"), ("done", None)]
+
+
+def test_no_kv_slot_halves_the_batch(monkeypatch):
+    """A decode returning 1 is retried with fewer tokens instead of failing the requests"""
+    llm = FakeLlama({"first prompt": "one", "second prompt": "two"}, max_decode_tokens=5)
+    events = run(monkeypatch, llm, ["first prompt", "second prompt"])
+    assert events["first prompt"] == [("token", "o"), ("token", "n"), ("token", "e"), ("done", None)]
+    assert events["second prompt"] == [("token", "t"), ("token", "w"), ("token", "o"), ("done", None)]
+    assert llm.decode_sizes[:3] == [16, 8, 4]
+
+
+def test_negative_decode_result_fails_active_requests(monkeypatch):
+    """Only a negative decode result fails every request in flight"""
+    llm = FakeLlama({"a": "xy", "b": "zw"})
+    llm.results = [-1]
+    events = run(monkeypatch, llm, ["a", "b"])
+    for prompt in ("a", "b"):
+        (event, error), done = events[prompt]
+        assert event == "error" and "returned -1" in str(error)
+        assert done == ("done", None)
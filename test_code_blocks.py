@@ -0,0 +1,30 @@
+"""
+Tests for code block extraction
+"""
+
+from code_blocks import CodeFenceParser, extract_code_blocks, CODE_BLOCK_PATTERN
+
+RESPONSE = (
+    "Here is the fix:\n```python\nprint('a')\n```\n"
+    "Call it with `run()`, then:\n```\nnpm start\n```\nDone."
+)
+
+
+def test_extracts_fenced_blocks():
+    """Blocks without a language tag are reported as plaintext"""
+    assert extract_code_blocks(RESPONSE) == [
+        {"language": "python", "code": "print('a')"},
+        {"language": "plaintext", "code": "npm start"},
+    ]
+
+
+def test_incremental_parser_matches_whole_text():
+    """Any split of the text yields the same blocks, each reported once its fence closes"""
+    expected = extract_code_blocks(RESPONSE)
+    fence_ends = [match.end() for match in CODE_BLOCK_PATTERN.finditer(RESPONSE)]
+    for split in range(len(RESPONSE) + 1):
+        parser = CodeFenceParser()
+        first = parser.feed(RESPONSE[:split])
+        second = parser.feed(RESPONSE[split:])
+        assert first + second == parser.blocks == expected
+        assert len(first) == sum(end <= split for end in fence_ends)
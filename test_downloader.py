@@ -0,0 +1,127 @@
+"""
+Tests for the model downloader against a local HTTP stand-in
+"""
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from downloader import download_file, DownloadError, DownloadCancelled
+
+PAYLOAD = bytes(range(256)) * 4096  # 1 MB
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD with Range support; can drop a connection mid-body once"""
+
+    fail_after = None  # Bytes to send before dropping the first full GET
+    ranges_supported = True
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _headers(self, status, length, content_range=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        if self.ranges_supported:
+            self.send_header("Accept-Ranges", "bytes")
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers(200, len(PAYLOAD))
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        RangeHandler.requests.append(range_header)
+        if range_header and self.ranges_supported:
+            start, _, end = range_header[len("bytes="):].partition("-")
+            start, end = int(start), int(end) if end else len(PAYLOAD) - 1
+            if start >= len(PAYLOAD):
+                self._headers(416, 0)
+                return
+            body = PAYLOAD[start:end + 1]
+            self._headers(206, len(body), f"bytes {start}-{end}/{len(PAYLOAD)}")
+            self.wfile.write(body)
+            return
+        self._headers(200, len(PAYLOAD))
+        if RangeHandler.fail_after is not None:
+            self.wfile.write(PAYLOAD[:RangeHandler.fail_after])
+            RangeHandler.fail_after = None
+            self.close_connection = True
+            return
+        self.wfile.write(PAYLOAD)
+
+
+@pytest.fixture
+def server():
+    RangeHandler.fail_after = None
+    RangeHandler.ranges_supported = True
+    RangeHandler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/model.gguf"
+    httpd.shutdown()
+
+
+def test_download_verifies_and_renames(server, tmp_path):
+    """Streams to .part, checks SHA-256 and renames into place"""
+    dest = tmp_path / "model.gguf"
+    download_file(server, dest, expected_sha256=hashlib.sha256(PAYLOAD).hexdigest())
+    assert dest.read_bytes() == PAYLOAD
+    assert not (tmp_path / "model.gguf.part").exists()
+
+
+def test_download_resumes_partial_file(server, tmp_path):
+    """An existing .part file is resumed with a Range request"""
+    dest = tmp_path / "model.gguf"
+    (tmp_path / "model.gguf.part").write_bytes(PAYLOAD[:300000])
+    download_file(server, dest, expected_sha256=hashlib.sha256(PAYLOAD).hexdigest())
+    assert dest.read_bytes() == PAYLOAD
+    assert RangeHandler.requests == ["bytes=300000-"]
+
+
+def test_download_retries_after_dropped_connection(server, tmp_path):
+    """A connection dropped mid-body is resumed from the bytes already written"""
+    RangeHandler.fail_after = 100000
+    dest = tmp_path / "model.gguf"
+    download_file(server, dest, retries=2, timeout=5)
+    assert dest.read_bytes() == PAYLOAD
+    assert RangeHandler.requests[-1] == "bytes=100000-"
+
+
+def test_parallel_ranges(server, tmp_path):
+    """Parallel byte ranges assemble the same file"""
+    dest = tmp_path / "model.gguf"
+    download_file(server, dest, connections=4, expected_sha256=hashlib.sha256(PAYLOAD).hexdigest())
+    assert dest.read_bytes() == PAYLOAD
+    assert len(RangeHandler.requests) == 4
+    assert not (tmp_path / "model.gguf.part.ranges").exists()
+
+
+def test_checksum_mismatch_discards_download(server, tmp_path):
+    """A bad checksum leaves neither the file nor the .part behind"""
+    dest = tmp_path / "model.gguf"
+    with pytest.raises(DownloadError):
+        download_file(server, dest, expected_sha256="0" * 64)
+    assert not dest.exists()
+    assert not (tmp_path / "model.gguf.part").exists()
+
+
+def test_stop_event_cancels_and_keeps_part(server, tmp_path):
+    """Setting the stop event ends the download between chunks, leaving a resumable .part"""
+    dest = tmp_path / "model.gguf"
+    stop = threading.Event()
+
+    def progress(received):
+        stop.set()
+
+    with pytest.raises(DownloadCancelled):
+        download_file(server, dest, progress=progress, stop=stop)
+    assert not dest.exists()
+    assert 0 < (tmp_path / "model.gguf.part").stat().st_size < len(PAYLOAD)
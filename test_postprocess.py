@@ -0,0 +1,34 @@
+"""
+Tests for the response post-processing pipeline
+"""
+
+import asyncio
+
+from postprocess import PostProcessingPipeline
+
+
+def test_stages_run_concurrently_and_can_be_disabled():
+    """Enabled stages overlap, their fields are merged, and skipped stages are counted"""
+    pipeline = PostProcessingPipeline()
+    running = []
+
+    @pipeline.stage("slow")
+    async def slow(text):
+        running.append("slow")
+        await asyncio.sleep(0.05)
+        return {"slow_saw": list(running)}
+
+    @pipeline.stage("fast")
+    async def fast(text):
+        running.append("fast")
+        return {"length": len(text)}
+
+    @pipeline.stage("off")
+    async def off(text):
+        raise AssertionError("disabled stage ran")
+
+    fields = asyncio.run(pipeline.run("hello", disabled={"off"}))
+    assert fields == {"slow_saw": ["slow", "fast"], "length": 5}
+    stats = pipeline.stats()
+    assert stats["slow"]["runs"] == 1 and stats["slow"]["max_ms"] >= 50
+    assert stats["off"] == {"runs": 0, "skipped": 1, "avg_ms": 0.0, "max_ms": 0.0}
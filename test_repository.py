@@ -0,0 +1,185 @@
+"""
+Tests for the MongoDB repositories (run against mongomock-motor)
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from repository import ConversationRepository, TopicRepository, MongoRepository
+from write_behind import WriteBehindBuffer
+
+
+def make_conversations(bucket_size: int) -> ConversationRepository:
+    client = mongomock_motor.AsyncMongoMockClient()
+    return ConversationRepository(client["test"]["conversations"], bucket_size=bucket_size)
+
+
+def messages(*numbers):
+    return [{"role": "user", "content": str(n)} for n in numbers]
+
+
+def contents(found):
+    return [int(message["content"]) for message in found]
+
+
+def test_appends_fill_newest_bucket_before_rolling_over():
+    """Later messages never land in an older bucket, so history stays in order"""
+    async def scenario():
+        conversations = make_conversations(bucket_size=4)
+        await conversations.ensure_indexes()
+        await conversations.append("u1", "s1", messages(1, 2, 3))
+        await conversations.append("u1", "s1", messages(4, 5))
+        await conversations.append("u1", "s1", messages(6))
+        await conversations.append_many([("u1", "s1", messages(7, 8, 9, 10, 11))])
+
+        buckets = await conversations.collection.find({"session_id": "s1"}).sort("seq", 1).to_list(10)
+        assert [contents(bucket["messages"]) for bucket in buckets] == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10, 11]]
+        assert [bucket["count"] for bucket in buckets] == [4, 4, 3]
+        assert contents(await conversations.recent_messages("u1", 10)) == list(range(2, 12))
+
+    asyncio.run(scenario())
+
+
+class SlowReadCollection:
+    """Pauses after each find_one so concurrent appends read the same newest bucket"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def find_one(self, *args, **kwargs):
+        found = await self.collection.find_one(*args, **kwargs)
+        await asyncio.sleep(0.01)
+        return found
+
+
+def test_concurrent_appends_never_share_a_bucket_seq():
+    """Writers racing to start the same bucket retry instead of inserting a duplicate seq"""
+    async def scenario():
+        conversations = make_conversations(bucket_size=4)
+        await conversations.ensure_indexes()
+        conversations.collection = SlowReadCollection(conversations.collection)
+        await asyncio.gather(
+            conversations.append("u1", "s1", messages(1)),
+            conversations.append("u1", "s1", messages(2, 3)),
+        )
+        bucket_id = await conversations.append("u1", "s1", messages(4, 5))
+
+        buckets = await conversations.collection.find({"session_id": "s1"}).sort("seq", 1).to_list(10)
+        assert [bucket["seq"] for bucket in buckets] == [0, 1]
+        assert bucket_id == str(buckets[1]["_id"])
+        assert [bucket["count"] for bucket in buckets] == [4, 1]
+        assert sorted(contents(buckets[0]["messages"])) == [1, 2, 3, 4]
+
+    asyncio.run(scenario())
+
+
+class FlakyCollection:
+    """Applies the first `failures` writes and then raises, like a timeout after the server committed"""
+
+    def __init__(self, collection, failures):
+        self.collection = collection
+        self.failures = failures
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def _write(self, name, *args, **kwargs):
+        result = await getattr(self.collection, name)(*args, **kwargs)
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("connection lost after write")
+        return result
+
+    async def update_one(self, *args, **kwargs):
+        return await self._write("update_one", *args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs):
+        return await self._write("insert_many", *args, **kwargs)
+
+
+def test_retried_batches_do_not_duplicate_messages():
+    """A write-behind retry after a partly applied batch stores each message once"""
+    async def scenario():
+        conversations = make_conversations(bucket_size=4)
+        await conversations.append("u1", "s1", messages(1, 2, 3))
+        conversations.collection = FlakyCollection(conversations.collection, failures=3)
+
+        buffer = WriteBehindBuffer(conversations.append_many, flush_interval=0.01, retries=4)
+        buffer.start()
+        await buffer.put(("u1", "s1", messages(4, 5)))
+        await buffer.put(("u1", "s1", messages(6, 7, 8, 9, 10)))
+        await buffer.put(("u2", "s2", messages(1)))
+        await buffer.close()
+
+        assert buffer.stats()["failed_attempts"] == 2
+        assert contents(await conversations.recent_messages("u1", 20)) == list(range(1, 11))
+        assert contents(await conversations.recent_messages("u2", 20)) == [1]
+
+    asyncio.run(scenario())
+
+
+class RejectOnceCollection:
+    """Fails one operation of the first bulk write, the way a racing upsert does, and applies the rest"""
+
+    def __init__(self, collection, index):
+        self.collection = collection
+        self.index = index
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, ops, ordered=True):
+        if self.index is None:
+            return await self.collection.bulk_write(ops, ordered=ordered)
+        rejected, self.index = self.index, None
+        await self.collection.bulk_write([op for i, op in enumerate(ops) if i != rejected], ordered=ordered)
+        raise BulkWriteError({"writeErrors": [{"index": rejected, "code": 11000, "errmsg": "duplicate key"}]})
+
+
+def test_topic_increments_retry_only_failed_operations():
+    """Operations applied before a partial bulk failure are not counted twice"""
+    async def scenario():
+        client = mongomock_motor.AsyncMongoMockClient()
+        topics = TopicRepository(RejectOnceCollection(client["test"]["user_topics"], index=1))
+        await topics.increment_many([
+            ("u1", [{"content": "python api"}]),
+            ("u2", [{"content": "react"}, {"content": "react and python"}]),
+        ])
+        assert await topics.get("u1") == {"python": 1, "api": 1}
+        assert await topics.get("u2") == {"react": 2, "python": 1}
+
+    asyncio.run(scenario())
+
+
+def test_history_is_seeded_once_even_after_increments():
+    """History from before aggregation is counted when a chat created the topic document first"""
+    async def scenario():
+        repo = MongoRepository.__new__(MongoRepository)
+        db = mongomock_motor.AsyncMongoMockClient()["test"]
+        repo.conversations = ConversationRepository(db.conversations)
+        repo.topics = TopicRepository(db.user_topics)
+        await repo.topics.ensure_indexes()
+
+        old = datetime.utcnow() - timedelta(days=30)
+        await db.conversations.insert_one({
+            "user_id": "u1", "session_id": "old", "created_at": old,
+            "messages": [{"role": "user", "content": "python question", "timestamp": old}]
+        })
+        new = [{"role": "user", "content": "react question", "timestamp": datetime.utcnow()}]
+        await repo.conversations.append("u1", "s1", new)
+        await repo.topics.increment("u1", new)
+
+        assert await repo.topic_counts("u1") == {"python": 1, "react": 1}
+        assert await repo.topic_counts("u1") == {"python": 1, "react": 1}
+
+    asyncio.run(scenario())
+
@@ -0,0 +1,65 @@
+"""
+Tests for the write-behind buffer
+"""
+
+import asyncio
+
+from write_behind import WriteBehindBuffer
+
+
+def test_flushes_on_batch_size():
+    """A full batch is written without waiting for the interval"""
+    async def scenario():
+        batches = []
+
+        async def flush(batch):
+            batches.append(list(batch))
+
+        buffer = WriteBehindBuffer(flush, max_batch=3, flush_interval=60)
+        buffer.start()
+        for i in range(3):
+            await buffer.put(i)
+        await asyncio.sleep(0.05)
+        assert batches == [[0, 1, 2]]
+        await buffer.close()
+
+    asyncio.run(scenario())
+
+
+def test_retries_then_flushes_on_close():
+    """Failed batches are retried and close() writes what is still queued"""
+    async def scenario():
+        batches = []
+        failures = [1]
+
+        async def flush(batch):
+            if failures[0]:
+                failures[0] -= 1
+                raise RuntimeError("write failed")
+            batches.append(list(batch))
+
+        buffer = WriteBehindBuffer(flush, max_batch=10, flush_interval=60, retries=2)
+        buffer.start()
+        await buffer.put("a")
+        await buffer.put("b")
+        await buffer.close()
+        assert batches == [["a", "b"]]
+        assert buffer.stats()["failed_attempts"] == 1
+        assert buffer.stats()["dropped"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_drops_after_retries():
+    """A batch that keeps failing is dropped and counted"""
+    async def scenario():
+        async def flush(batch):
+            raise RuntimeError("write failed")
+
+        buffer = WriteBehindBuffer(flush, max_batch=10, flush_interval=0.01, retries=2)
+        buffer.start()
+        await buffer.put("a")
+        await buffer.close()
+        assert buffer.stats()["dropped"] == 1
+
+    asyncio.run(scenario())
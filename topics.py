@@ -0,0 +1,39 @@
+"""
+Conversation topic detection for the Coding AI Assistant
+Topic counts are aggregated per user at write time and read by /suggest and the chat context
+"""
+
+from typing import Dict, List, Any, Set
+
+from keywords import scan_keywords
+
+# Topics that imply a default language/framework preference
+TOPIC_PREFERENCES = {
+    "python": ("languages", "Python"),
+    "javascript": ("languages", "JavaScript"),
+    "react": ("frameworks", "React"),
+}
+
+
+def detect_topics(text: str) -> Set[str]:
+    """Topics mentioned in a piece of text (keywords are in keywords.KEYWORD_TABLE["topic"])"""
+    return scan_keywords(text)["topic"]
+
+
+def count_topics(messages: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Number of messages mentioning each topic"""
+    counts: Dict[str, int] = {}
+    for message in messages:
+        for topic in detect_topics(message.get("content", "")):
+            counts[topic] = counts.get(topic, 0) + 1
+    return counts
+
+
+def preferences_from_topics(counts: Dict[str, int]) -> Dict[str, List[str]]:
+    """Default preferences inferred from a user's topic counts, most discussed first"""
+    preferences: Dict[str, List[str]] = {}
+    for topic in sorted(counts, key=counts.get, reverse=True):
+        if topic in TOPIC_PREFERENCES and counts[topic] > 0:
+            key, value = TOPIC_PREFERENCES[topic]
+            preferences.setdefault(key, []).append(value)
+    return preferences
@@ -3,13 +3,15 @@ Utility functions for the Coding AI Assistant
 """
 
 import re
-import ast
 import json
 import hashlib
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import logging
 
+from keywords import scan_keywords
+from analysis import analyze_python, analyze_javascript
+
 logger = logging.getLogger(__name__)
 
 class CodeAnalyzer:
@@ -26,53 +28,7 @@ class CodeAnalyzer:
         Returns:
             Dictionary with analysis results
         """
-        results = {
-            "valid": True,
-            "errors": [],
-            "warnings": [],
-            "suggestions": []
-        }
-        
-        # Check for syntax errors
-        try:
-            tree = ast.parse(code)
-            results["ast_valid"] = True
-        except SyntaxError as e:
-            results["valid"] = False
-            results["errors"].append({
-                "line": e.lineno,
-                "column": e.offset,
-                "message": e.msg,
-                "type": "SyntaxError"
-            })
-            return results
-        except Exception as e:
-            results["valid"] = False
-            results["errors"].append({
-                "message": str(e),
-                "type": "ParseError"
-            })
-            return results
-        
-        # Analyze the AST
-        analyzer = PythonASTAnalyzer()
-        analyzer.visit(tree)
-        
-        # Add analysis results
-        results["warnings"].extend(analyzer.warnings)
-        results["suggestions"].extend(analyzer.suggestions)
-        
-        # Check for common issues
-        if not analyzer.has_main_guard and analyzer.has_executable_code:
-            results["suggestions"].append(
-                "Consider adding 'if __name__ == \"__main__\":' guard for executable code"
-            )
-        
-        if analyzer.missing_imports:
-            for imp in analyzer.missing_imports:
-                results["warnings"].append(f"Potentially missing import: {imp}")
-        
-        return results
+        return analyze_python(code)
     
     @staticmethod
     def check_javascript_syntax(code: str) -> Dict[str, Any]:
@@ -85,67 +41,7 @@ class CodeAnalyzer:
         Returns:
             Dictionary with analysis results
         """
-        results = {
-            "valid": True,
-            "errors": [],
-            "warnings": [],
-            "suggestions": []
-        }
-        
-        # Check for balanced brackets
-        brackets = {'{': '}', '[': ']', '(': ')'}
-        stack = []
-        
-        for i, char in enumerate(code):
-            if char in brackets:
-                stack.append((char, i))
-            elif char in brackets.values():
-                if not stack:
-                    results["valid"] = False
-                    results["errors"].append({
-                        "position": i,
-                        "message": f"Unmatched closing bracket '{char}'",
-                        "type": "BracketError"
-                    })
-                else:
-                    opening, pos = stack.pop()
-                    if brackets[opening] != char:
-                        results["valid"] = False
-                        results["errors"].append({
-                            "position": i,
-                            "message": f"Mismatched brackets: '{opening}' at position {pos} and '{char}' at position {i}",
-                            "type": "BracketError"
-                        })
-        
-        if stack:
-            results["valid"] = False
-            for bracket, pos in stack:
-                results["errors"].append({
-                    "position": pos,
-                    "message": f"Unclosed bracket '{bracket}'",
-                    "type": "BracketError"
-                })
-        
-        # Check for common patterns
-        lines = code.split('\n')
-        for i, line in enumerate(lines, 1):
-            # Check for console.log in production code
-            if 'console.log' in line and '// debug' not in line.lower():
-                results["warnings"].append({
-                    "line": i,
-                    "message": "console.log found - consider removing for production",
-                    "type": "DebugCode"
-                })
-            
-            # Check for var usage (suggest let/const)
-            if re.search(r'\bvar\s+', line):
-                results["suggestions"].append({
-                    "line": i,
-                    "message": "Consider using 'let' or 'const' instead of 'var'",
-                    "type": "ModernJS"
-                })
-        
-        return results
+        return analyze_javascript(code)
     
     @staticmethod
     def extract_imports(code: str, language: str = "python") -> List[str]:
@@ -177,79 +73,6 @@ class CodeAnalyzer:
         return imports
 
 
-class PythonASTAnalyzer(ast.NodeVisitor):
-    """AST visitor for Python code analysis"""
-    
-    def __init__(self):
-        self.warnings = []
-        self.suggestions = []
-        self.imports = set()
-        self.defined_names = set()
-        self.used_names = set()
-        self.has_main_guard = False
-        self.has_executable_code = False
-        self.missing_imports = set()
-    
-    def visit_Import(self, node):
-        for alias in node.names:
-            self.imports.add(alias.name)
-        self.generic_visit(node)
-    
-    def visit_ImportFrom(self, node):
-        if node.module:
-            self.imports.add(node.module)
-        self.generic_visit(node)
-    
-    def visit_FunctionDef(self, node):
-        self.defined_names.add(node.name)
-        
-        # Check for missing docstring
-        if not ast.get_docstring(node):
-            self.suggestions.append({
-                "line": node.lineno,
-                "message": f"Function '{node.name}' lacks a docstring",
-                "type": "Documentation"
-            })
-        
-        self.generic_visit(node)
-    
-    def visit_ClassDef(self, node):
-        self.defined_names.add(node.name)
-        
-        # Check for missing docstring
-        if not ast.get_docstring(node):
-            self.suggestions.append({
-                "line": node.lineno,
-                "message": f"Class '{node.name}' lacks a docstring",
-                "type": "Documentation"
-            })
-        
-        self.generic_visit(node)
-    
-    def visit_Name(self, node):
-        if isinstance(node.ctx, ast.Load):
-            self.used_names.add(node.id)
-        elif isinstance(node.ctx, ast.Store):
-            self.defined_names.add(node.id)
-        self.generic_visit(node)
-    
-    def visit_If(self, node):
-        # Check for main guard
-        if isinstance(node.test, ast.Compare):
-            if isinstance(node.test.left, ast.Name) and node.test.left.id == "__name__":
-                if any(isinstance(op, ast.Eq) for op in node.test.ops):
-                    if any(isinstance(comp, ast.Constant) and comp.value == "__main__" 
-                           for comp in node.test.comparators):
-                        self.has_main_guard = True
-        self.generic_visit(node)
-    
-    def visit_Expr(self, node):
-        # Check for executable code at module level
-        if isinstance(node.value, ast.Call):
-            self.has_executable_code = True
-        self.generic_visit(node)
-
-
 class ConversationManager:
     """Manages conversation context and history"""
     
@@ -287,23 +110,11 @@ class ConversationManager:
             context["has_code"] = True
             context["languages"].extend([m for m in matches if m])
         
-        # Check for language mentions
-        languages = ["python", "javascript", "typescript", "java", "c++", "rust", "go"]
-        for lang in languages:
-            if lang in message.lower():
-                context["languages"].append(lang)
-        
-        # Check for framework mentions
-        frameworks = ["react", "vue", "angular", "django", "flask", "fastapi", "express", "nextjs"]
-        for fw in frameworks:
-            if fw in message.lower():
-                context["frameworks"].append(fw)
-        
-        # Check for concept mentions
-        concepts = ["api", "database", "authentication", "deployment", "testing", "docker", "ci/cd"]
-        for concept in concepts:
-            if concept in message.lower():
-                context["concepts"].append(concept)
+        # Check for language, framework and concept mentions in one scan
+        hits = scan_keywords(message)
+        context["languages"].extend(hits["language"])
+        context["frameworks"].extend(hits["framework"])
+        context["concepts"].extend(hits["concept"])
         
         # Remove duplicates
         context["languages"] = list(set(context["languages"]))
@@ -0,0 +1,129 @@
+"""
+Write-behind buffer for the Coding AI Assistant
+Queues writes in memory and flushes them to storage in batches from a background task
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Queued by close() to tell the flusher to finish after the entries ahead of it
+_STOP = object()
+
+
+class WriteBehindBuffer:
+    """Bounded queue drained by a background flusher
+
+    Entries are flushed through flush_fn(batch) once max_batch entries are
+    waiting or flush_interval seconds have passed since the first one arrived.
+    Failed batches are retried with exponential backoff and dropped (and
+    counted) after `retries` attempts; a failed attempt may have been partly
+    applied, so flush_fn must be safe to repeat. When max_pending entries are
+    queued, put() waits for room, so memory stays bounded when storage falls
+    behind.
+    """
+
+    def __init__(self, flush_fn: Callable[[List[Any]], Awaitable[None]], max_batch: int = 100,
+                 flush_interval: float = 0.5, max_pending: int = 10000, retries: int = 3):
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_pending)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # Monitoring counters
+        self.enqueued = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failed_attempts = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        """Start the flusher task on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, entry: Any) -> None:
+        """Queue an entry for the next batch, waiting only if the buffer is full"""
+        if self._closing:
+            raise RuntimeError("Write-behind buffer is closed")
+        await self._queue.put(entry)
+        self.enqueued += 1
+
+    async def _next_batch(self) -> Tuple[List[Any], bool]:
+        """Wait for one entry, then collect more until the batch is full or the interval elapses
+
+        Returns the batch and whether close() was requested.
+        """
+        entry = await self._queue.get()
+        if entry is _STOP:
+            return [], True
+        batch = [entry]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    async def _flush(self, batch: List[Any]) -> None:
+        for attempt in range(1, self.retries + 1):
+            try:
+                await self.flush_fn(batch)
+                self.flushed += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                self.failed_attempts += 1
+                if attempt == self.retries:
+                    self.dropped += len(batch)
+                    logger.error(f"Dropping {len(batch)} buffered writes after {attempt} attempts: {e}")
+                    return
+                logger.warning(f"Buffered write attempt {attempt} failed, retrying: {e}")
+                await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), 10))
+
+    async def _run(self) -> None:
+        while True:
+            batch, stop = await self._next_batch()
+            if batch:
+                await self._flush(batch)
+            if stop:
+                return
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Stop accepting entries and flush everything already queued"""
+        if self._closing or self._task is None:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._queue.put(_STOP), timeout=timeout)
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            self.dropped += self._queue.qsize()
+            logger.error(f"Shutdown flush timed out, dropping {self._queue.qsize()} buffered writes")
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and flush counters for monitoring"""
+        return {
+            "pending": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "avg_batch_size": round(self.flushed / self.batches, 2) if self.batches else 0.0,
+            "failed_attempts": self.failed_attempts,
+            "dropped": self.dropped,
+        }